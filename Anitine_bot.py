@@ -1,360 +1,73 @@
-from telegram import BotCommand, MenuButtonCommands, Update, KeyboardButton, ReplyKeyboardMarkup
-from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
 import asyncio
-import json
-import os
+import datetime
+import time
+
+from telegram import (
+    Bot,
+    BotCommand,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultPhoto,
+    InputTextMessageContent,
+    KeyboardButton,
+    Message,
+    MenuButtonCommands,
+    ReplyKeyboardMarkup,
+    Update,
+)
+from telegram.constants import ChatType
+from telegram.error import BadRequest
+from telegram.ext import Application, CommandHandler, ContextTypes, InlineQueryHandler, MessageHandler, filters
 import random
-from urllib.error import HTTPError, URLError
-from urllib.request import Request, urlopen
 
-ANILIST_ENDPOINT = "https://graphql.anilist.co"
-_anilist_cover_cache: dict[str, str] = {}
+from catalog import Catalog, GameIndex
+from config import Config
+from metrics import ACTIVE_GAMES, instrument
+from persistence import open_persistence
+from ratelimit import PRIORITY_BULK, SendScheduler
+from rotation import permute
+from router import TextRouter
+from services import BotServices
+from updates import ChatOrderedUpdateProcessor
 
 
+def _services(context: ContextTypes.DEFAULT_TYPE) -> BotServices:
+    return context.bot_data["services"]
 
-def _fetch_anilist_cover_url(title: str) -> str | None:
-    cached = _anilist_cover_cache.get(title)
-    if cached:
-        return cached
 
-    query = """
-    query ($search: String) {
-      Media(search: $search, type: ANIME) {
-        coverImage {
-          extraLarge
-          large
-        }
-      }
-    }
-    """.strip()
-
-    body = json.dumps({"query": query, "variables": {"search": title}}).encode("utf-8")
-    req = Request(
-        ANILIST_ENDPOINT,
-        data=body,
-        headers={"Content-Type": "application/json", "Accept": "application/json"},
-        method="POST",
-    )
-
-    try:
-        with urlopen(req, timeout=8) as resp:
-            payload = json.load(resp)
-    except (HTTPError, URLError, TimeoutError, ValueError):
-        return None
-    data = payload.get("data")
-    if not isinstance(data, dict):
-        return None
-
-    media = data.get("Media")
-    if not isinstance(media, dict):
-        return None
-
-    cover = media.get("coverImage")
-    if not isinstance(cover, dict):
-        return None
-
-    url = cover.get("extraLarge") or cover.get("large")
-    if isinstance(url, str) and url:
-        _anilist_cover_cache[title] = url
-        return url
-
-    return None
+async def _fetch_anilist_cover_url(services: BotServices, title: str) -> str | None:
+    return await services.covers.resolve(title)
 
 
 async def post_init(application: Application) -> None:
-    await application.bot.set_my_commands(
-        [
-            BotCommand("start", "Запустить бота"),
-            BotCommand("help", "Показать помощь"),
-            BotCommand("anime", "Посоветовать аниме"),
-            BotCommand("game", "Игра"),
-            BotCommand("photoid", "Получить file_id фото"),
-        ]
-    )
-    await application.bot.set_chat_menu_button(menu_button=MenuButtonCommands())
-
-app = Application.builder().token("").post_init(post_init).build()
-
-aiky_messages = [
-    "Я тебя люблю и очень рада, что ты здесь 💖",
-    "Ты делаешь Anitime чуточку теплее для меня ✨",
-    "Мне приятно видеть тебя у нас 🌸",
-    "Ты — часть моего уютного мира 💫",
-    "Спасибо, что заглянул, я тебя люблю 💕",
-    "С тобой смотреть аниме ещё приятнее 🍿💗",
-    "Для меня ты всегда желанный гость 🤍",
-    "Я рада тебе больше, чем ты думаешь 😊",
-    "Мне приятно быть рядом с тобой на Anitime 🌙",
-    "Ты даришь мне хорошее настроение 💞",
-    "Я тебя ценю и люблю 🌷",
-    "Здесь я всегда рада тебе ✨",
-    "Спасибо, что выбрал меня 💖",
-    "Ты — важная часть Anitime для меня 🌸",
-    "Оставайся со мной, я тебя люблю 💗",
-    "Я всегда рада тебе и твоей улыбке 💕",
-    "Ты делаешь мой день лучше ✨",
-    "Спасибо, что ты со мной 💖",
-    "Твоё присутствие очень ценно для меня 🌸",
-    "Мне приятно, что ты выбрал Anitime 🤍",
-    "Ты приносишь уют в мой мир 💫",
-    "Я рада каждому твоему визиту 😊",
-    "С тобой здесь по-настоящему тепло 💗",
-    "Ты — гость, которого я всегда жду 🌷",
-    "Я счастлива видеть тебя 💕",
-    "Ты наполняешь Anitime добром для меня ✨",
-    "Мне важно, что ты рядом 💖",
-    "Ты делаешь это место живым для меня 🌸",
-    "Спасибо, что доверяешь мне 🤍",
-    "Для меня ты всегда желанный здесь 💫",
-    "Я ценю каждое твоё появление 😊",
-    "Ты часть моей маленькой истории 💗",
-    "С тобой Anitime становится лучше для меня 🌷",
-    "Я рада делить этот момент с тобой 💕",
-    "Ты приносишь свет и хорошее настроение мне ✨",
-]
-
-emoji_game_list = [
-    {"emoji": "🪚👨", "answer": "Человек-бензопила"},
-    {"emoji": "📓💀", "answer": "ТЕТРАДЬ СМЕРТИ"},
-    {"emoji": "🍥🥷", "answer": "НАРУТО"},
-    {"emoji": "🏴‍☠️🗺️", "answer": "ВАН-ПИС"},
-    {"emoji": "⚔️👹", "answer": "КЛИНОК РАССЕКАЮЩИЙ ДЕМОНОВ"},
-    {"emoji": "🌙✨", "answer": "СЕЙЛОР МУН"},
-    {"emoji": "🪨🧪", "answer": "ДОКТОР СТОУН"},
-    {"emoji": "🎸😳", "answer": "ОДИНОКИЙ РОКЕР"},
-    {"emoji": "👻🏮", "answer": "УНЕСЕННЫЕ ПРИЗРАКАМИ"},
-    {"emoji": "🌳🐾", "answer": "МОЙ СОСЕД ТОТОРО"},
-    {"emoji": "🕵️👨‍👩‍👧", "answer": "СЕМЬЯ ШПИОНОВ"},
-    {"emoji": "⚔️🌑", "answer": "BERSERK"},
-    {"emoji": "⛩️🗡️", "answer": "БЕЗДОМНЫЙ БОГ"},
-    {"emoji": "🌀👻", "answer": "МАГИЧЕСКАЯ БИТВА"},
-    {"emoji": "🎤👶⭐", "answer": "ЗВЁЗДНОЕ ДИТЯ"},
-    {"emoji": "🍀⚔️", "answer": "ЧЕРНЫЙ КЛЕВЕР"},
-    {"emoji": "⏳🏝️", "answer": "ЛЕТНЕЕ ВРЕМЯ"},
-    {"emoji": "🎹🎻", "answer": "ТВОЯ АПРЕЛЬСКАЯ ЛОЖЬ"},
-    {"emoji": "🤖👦", "answer": "ЕВАНГЕЛИОН"},
-    {"emoji": "🏐🔥", "answer": "ВОЛЕЙБОЛ"},
-    {"emoji": "😇🏠", "answer": "АНГЕЛ ЖИВУЩИЙ ПО СОСЕДСТВУ"},
-    {"emoji": "📏💔", "answer": "5 САНТИМЕТРОВ В СЕКУНДУ"},
-    {"emoji": "🦊🍵", "answer": "ЗАБОТЛИВАЯ 800-ЛЕТНЯЯ ЖЕНА"},
-    {"emoji": "🚀👧❤️", "answer": "МИЛЫЙ ВО ФРАНКСЕ"},
-    {"emoji": "🦸‍♂️🏫", "answer": "МОЯ ГЕРОЙСКАЯ АКАДЕМИЯ"},
-    {"emoji": "🌌🔁", "answer": "ТВОЕ ИМЯ"},
-    {"emoji": "🧝‍♀️🕯️", "answer": "ПРОВОЖАЮЩИЙ В ПОСЛЕДНИЙ ПУТЬ ФРИРЕН"},
-    {"emoji": "🧵👗💞", "answer": "ЭТА ФАРФОРОВАЯ КУКЛА ВЛЮБИЛАСЬ"},
-    {"emoji": "🕵️‍♂️⚰️", "answer": "ДЕТЕКТИВ УЖЕ МЕРТВ"},
-    {"emoji": "🧑‍🎤👹", "answer": "ТОКИЙСКИЙ ГУЛЬ"},
-    {"emoji": "🧱⚔️", "answer": "АТАКА ТИТАНОВ"},
-    {"emoji": "♟️👑", "answer": "КОД ГИАСС"},
-    {"emoji": "🧑‍🍳⚔️", "answer": "ПОВАР-БОЕЦ"},
-    {"emoji": "🧠🔪", "answer": "ПАРАЗИТ"},
-    {"emoji": "🎮🔁", "answer": "РЕ:ЗЕРО"},
-    {"emoji": "👊👨‍🦲", "answer": "ВАНПАНЧМЕН"},
-    {"emoji": "🐺🌕", "answer": "ВОЛЧИЦА И ПРЯНОСТИ"},
-    {"emoji": "🧑‍🎓🧠", "answer": "КЛАСС УБИЙЦ"},
-    {"emoji": "🧑‍🚀🤠", "answer": "КОБОЙ БИБОП"},
-    {"emoji": "🎭🎤", "answer": "АКТЁРЫ ОСЛЕПЛЕННЫЕ СЦЕНОЙ"},
-    {"emoji": "🧛‍♂️🌙", "answer": "ХЕЛЛСИНГ"},
-    {"emoji": "🧬👦", "answer": "ДОРОХЕДОРО"},
-    {"emoji": "💀⚔️👑", "answer": "ОВЕРЛОРД"},
-    {"emoji": "🧙‍♂️📜", "answer": "РЕИНКАРНАЦИЯ БЕЗРАБОТНОГО"},
-    {"emoji": "🏀🔥", "answer": "БАСКЕТБОЛ КУРОКО"},
-    {"emoji": "👧🎒🌧️", "answer": "САД ИЗЯЩНЫХ СЛОВ"},
-    {"emoji": "🧑‍⚕️😈", "answer": "ДОКТОР СМЕРТИ"},
-    {"emoji": "🧠📱", "answer": "СТЕЙНС ГЕЙТ"},
-    {"emoji": "🪄👑", "answer": "СУДЬБА: НАЧАЛО"},
-    {"emoji": "🎻👦💔", "answer": "ТВОЯ ЛОЖЬ В АПРЕЛЕ"},
-    {"emoji": "🏹👧", "answer": "МАДОКА МАГИКА"},
-    {"emoji": "🐉⚔️", "answer": "СЕМЬ СМЕРТНЫХ ГРЕХОВ"},
-    {"emoji": "🧑‍🎤🎶", "answer": "БОЧЧИ РОК"},
-    {"emoji": "👊🩸", "answer": "ДОРОХЕДОРО"},
-    {"emoji": "🌸👘", "answer": "КЛИНОК РАССЕКАЮЩИЙ ДЕМОНОВ: КВАРТАЛ КРАСНЫХ ФОНАРЕЙ"},
-    {"emoji": "🧑‍🚒🔥", "answer": "ОГНЕННАЯ БРИГАДА ПОЖАРНЫХ"},
-    {"emoji": "🕶️🤖", "answer": "ПРИЗРАК В ДОСПЕХАХ"},
-    {"emoji": "🧑‍🎨👧", "answer": "ГОЛУБОЙ ПЕРИОД"},
-    {"emoji": "🐱🌙", "answer": "КОШКА-ВЕДЬМА"}
-]
-
-anime_list = [
-    {
-        "title": "Человек-бензопила",
-        "description": (
-            "Дэндзи — бедный подросток, который охотится на демонов вместе с Почитой-бензопилой, "
-            "чтобы выплатить долг.\n"
-            "После трагедии он становится Человеком-бензопилой и вступает в ряды охотников на демонов."
-        ),
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4303601/8205541e-8436-41f8-8dcf-720400965d5e/1920x1080",
-    },
-    {
-        "title": "АЛЯ ИНОГДА КОКЕТНИЧАЕТ СО МНОЙ ПО-РУССКИ",
-        "description": (
-            "Романтическая комедия о школьнице Але, которая умело сочетает дерзость и очарование, "
-            "кокетничая на русском языке. Следите за ее приключениями и неожиданными поворотами сюжета!"
-        ),
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/9784475/b9616eb3-53fc-45b9-a803-d7328d47aa4a/1920x",
-    },
-    {
-        "title": "BERSERK",
-        "description": "Наёмник Гатс сражается против демонов и судьбы в мрачном мире, преследуемый клеймом. История дружбы, предательства и борьбы с неизбежным.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1600647/6fcabf86-0197-4bd9-a31a-f1cb460fb04c/1920x",
-    },
-    {
-        "title": "ТЕТРАДЬ СМЕРТИ",
-        "description": "Психологический триллер о старшекласснике Лайте Ягами, который находит Тетрадь смерти, позволяющую убивать людей, просто записывая их имена. Его игра в кошки-мышки с гениальным детективом L держит в напряжении до последней минуты!",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1777765/d6808a93-a518-40c4-8d01-ef9dd3bf0420/1920x",
-    },
-    {
-        "title": "НЕОБЬЯТНЫЙ ОКЕАН",
-        "description": "Эпичная комедия про студента Иори, который приезжает в приморский городок, мечтая о нормальной уни-жизни с девчонками и тусами. Но вместо этого влипает в клуб дайвинга с кучей голых алкашей-мужиков, которые заставляют его пить как не в себя.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1599028/ea5299b0-ee59-41b8-8a31-46d872bd13b1/1920x",
-    },
-    {
-        "title": "НАРУТО",
-        "description": "Удзумаки Наруто — юный ниндзя, мечтающий стать Хокаге. Он сражается с врагами, защищает друзей и раскрывает тайну Девятихвостого внутри себя, проходя путь от изгоя до героя деревни Коноха.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1704946/e63beb56-0433-4bbf-ae70-5d85a5ed8945/1920x",
-    },
-    {
-        "title": "МАГИЧЕСКАЯ БИТВА",
-        "description": "Итадори Юдзи попадает в мир проклятий после встречи с опасным артефактом. Он вступает в училище магов, чтобы сражаться с проклятиями и лишить силу легендарного Сукуны.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/6201401/bfd6c4b8-2796-4727-8725-59651d2820a7/1920x",
-    },
-    {
-        "title": "ЗВЁЗДНОЕ ДИТЯ",
-        "description": "Описание пока не добавлено.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4483445/2d7148a7-0b7d-4af5-b4ad-c86526a2d515/1920x",
-    },
-    {
-        "title": "ЧЕРНЫЙ КЛЕВЕР",
-        "description": "Аста и Юно — сироты, выросшие в церкви королевства Клевер. Юно — гений магии ветра, а Аста родился без магии, но обладает редкой анти-магией и несгибаемой волей. Они соперничают и мечтают стать Королем магов, проходя через испытания, битвы и дружбу.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4303601/d08031d8-1021-4fe1-897d-d1899d12b3b4/1920x",
-    },
-    {
-        "title": "ЛЕТНЕЕ ВРЕМЯ",
-        "description": "Синпэй Адзиро — обычный парень, который возвращается на родной остров, но после загадочной смерти подруги оказывается втянут в кошмар с тенями, убийствами и бесконечными перезапусками времени.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4303601/3baadc5f-6d3b-492e-9323-c74cd5731003/1920x",
-    },
-    {
-        "title": "ТВОЯ АПРЕЛЬСКАЯ ЛОЖЬ",
-        "description": "Коусэй Арима — талантливый пианист, потерявший способность слышать музыку после смерти матери, чья жизнь меняется, когда он встречает яркую и свободолюбивую скрипачку, возвращающую ему цвет, боль и смысл жизни.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4303601/2641b207-d7b0-45e6-8759-1190580596dc/1920x",
-    },
-    {
-        "title": "ОДИНОКИЙ РОКЕР",
-        "description": "Хитори Гото — социально тревожная школьница с мечтой стать рок-звездой, которая прячется за гитарой и неожиданно находит друзей, сцену и себя в шуме маленькой инди-группы.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4774061/e44882d4-8436-497f-b6fb-54f916db1cfe/1920x",
-    },
-    {
-        "title": "ЕВАНГЕЛИОН",
-        "description": "Школьник Синдзи Икари вынужден пилотировать гигантского био‑меха «Евангелион» для защиты человечества от Ангелов. За битвами скрываются психологические драмы и тайны организации NERV.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1900788/4a0827fc-b53b-4615-8aae-736eeb014c8b/1920x",
-    },
-    {
-        "title": "ВОЛЕЙБОЛ",
-        "description": "Сёё Хината, вдохновлённый «Маленьким гигантом», вступает в команду Карасуно и вместе с Тобио Кагеяма стремится покорить вершины школьного волейбола.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1599028/c11131ea-c6e0-4a0e-bdda-9009da1d8c30/1920x",
-    },
-    {
-        "title": "СЕМЬЯ ШПИОНОВ",
-        "description": "Семья, собранная ради тайной миссии: шпион, телепат и убийца пытаются ужиться и сохранять секреты.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/10893610/e288334b-85e2-4790-9fad-012b829132a3/1920x",
-    },
-    {
-        "title": "СЕЙЛОР МУН",
-        "description": "Усаги Цукино становится воином любви и справедливости, чтобы защитить Землю от сил тьмы, находя друзей и раскрывая судьбу Луны.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1600647/e4f95b9d-a306-4481-a19c-5e16f5591d4e/300x450",
-    },
-    {
-        "title": "ДЕТЕКТИВ УЖЕ МЕРТВА",
-        "description": "Кимидзука встречает детектива Сиесту, чья судьба оставляет загадку и след, который невозможно забыть.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4303601/9ebdf327-9687-42b5-b4ce-1faec422eb21/1920x",
-    },
-    {
-        "title": "ЭТА ФАРФОРОВАЯ КУКЛА ВЛЮБИЛАСЬ",
-        "description": "Годзё Вакана и Мэрин Китагавы создают косплей, преодолевая неуверенность и открывая чувства.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4303601/654c6424-8d9a-476a-853e-38c49eed3a21/1920x",
-    },
-    {
-        "title": "ПРОВОЖАЮЩИЙ В ПОСЛЕДНИЙ ПУТЬ ФРИРЕН",
-        "description": "Фрирен — бессмертная эльфийка-маг, которая после победы над Королём демонов отправляется в тихое путешествие, заново осмысливая дружбу, утраты и то, как мимолётна человеческая жизнь.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/9784475/c1ef8c0c-23b8-477e-a42d-9f8d85396ec8/300x450",
-    },
-    {
-        "title": "АНГЕЛ ЖИВУЩИЙ ПО СОСЕДСТВУ",
-        "description": "Махиру Сиина — идеальная школьная «ангел», которая живёт по соседству с замкнутым Аманэ, и их простая забота друг о друге постепенно превращает одиночество в тёпкую, тихую близость.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4303601/2641b207-d7b0-45e6-8759-1190580596dc/1920x",
-    },
-    {
-        "title": "5 САНТИМЕТРОВ В СЕКУНДУ",
-        "description": "Такаки Тоно — обычный мальчик, чья жизнь проходит под знаком расстояний, редких встреч и несказанных чувств, показывая, как медленно и болезненно люди могут отдаляться друг от друга.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1777765/087dfb5c-9270-4f50-826d-44a86f0bea6b/1920x",
-    },
-    {
-        "title": "МОЙ СОСЕД ТОТОРО",
-        "description": "Сацуки и Мэй — две сестры, которые переезжают в деревню и находят волшебного духа леса Тоторо, открывающего им мир детского воображения, доброты и тихого чуда.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/10703959/507d8d5c-87e0-4b2e-8da3-e699976ab1cf/1920x",
-    },
-    {
-        "title": "ЗАБОТЛИВАЯ 800-ЛЕТНЯЯ ЖЕНА",
-        "description": "Сэнко — 800-летняя лисья богиня, которая появляется в жизни уставшего офисного работника, чтобы заботой, теплом и домашним уютом исцелять его от повседневного выгорания.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1946459/4ce389cc-6a39-46a4-b60d-cef3e0d977cf/1920x",
-    },
-    {
-        "title": "ПЕСНЬ НОЧНЫХ СОВ",
-        "description": "Мидори — обычная школьница, чья жизнь переворачивается после встречи с загадочными «Ночными совами», тайным клубом ночных приключений, где она открывает дружбу, мечты и магию в тишине ночного города.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4303601/11ff3951-f0f5-426d-a75d-3f77c075c0c7/1920x",
-    },
-    {
-        "title": "МИЛЫЙ ВО ФРАНКСЕ",
-        "description": "Хиро — замкнутый подросток, который вместе с загадочной Франксом по имени 02 сражается с огромными монстрами, открывая в себе смелость, любовь и смысл собственного существования.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1900788/97e30fe2-c0c3-4993-930e-a775056e40a7/1920x",
-    },
-    {
-        "title": "ДОКТОР СТОУН",
-        "description": "Сенку Исигами — гений науки, который после таинственного каменного сна человечества решает заново восстановить цивилизацию, используя изобретения, эксперименты и смекалку, чтобы вернуть людям технологии и надежду.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4483445/8c4aef76-eae3-4d13-a0e4-044fd980a22b/1920x",
-    },
-    {
-        "title": "МОЯ ГЕРОЙСКАЯ АКАДЕМИЯ",
-        "description": "Изуку Мидория — обычный мальчик без суперспособностей в мире, где они есть у всех, который мечтает стать героем и, получив силу «Плюс Ультра», поступает в Академию героев, чтобы защищать людей и воплотить свои идеалы.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/9784475/26f8c07b-31a0-49c9-82c4-360dd5e64fb0/1920x",
-    },
-    {
-        "title": "ТВОЕ ИМЯ",
-        "description": "Таки и Мицуха — два незнакомца, чьи тела и жизни внезапно начинают меняться местами, и через эту загадочную связь они ищут друг друга, преодолевая время, расстояния и судьбу.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1777765/bb567391-9e94-4fa9-b926-2538f292a13a/1920x",
-    },
-    {
-        "title": "УНЕСЕННЫЕ ПРИЗРАКАМИ",
-        "description": "Тихиро — обычная девочка, которая попадает в волшебный мир духов, где должна найти смелость и находчивость, чтобы спасти своих родителей и вернуться домой.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1900788/6c61384e-41b6-4bc5-b5d7-856d75d99146/1920x",
-    },
-    {
-        "title": "ВАН-ПИС",
-        "description": "Монки Д. Луффи — мальчик с резиновым телом, который мечтает стать Королём пиратов, собирая команду, исследуя опасные моря и сражаясь с могущественными врагами.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/6201401/3f0fbf88-6f11-4307-b169-8474d1acbdfa/1920x",
-    },
-    {
-        "title": "КЛИНОК РАССЕКАЮЩИЙ ДЕМОНОВ",
-        "description": "Танжиро Камадо — добрый юноша, ставший охотником на демонов после трагедии в семье, который вместе с друзьями сражается с чудовищами, защищая людей и ищет способ вернуть сестру к человеческому облику.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4716873/277f9057-1833-444b-9b13-bb0446472ec7/1920x",
-    },
-    {
-        "title": "БЕЗДОМНЫЙ БОГ",
-        "description": "Кудзё Ками и Фурутори — бог без дома, который вместе с маленькой помощницей путешествует по миру, сталкиваясь с людьми и странностями, открывая ценность дружбы, заботы и простых радостей.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/4774061/8d10d66a-2b2c-4f18-92d1-3198500ca166/1920x",
-    },
-    {
-        "title": "ЗОЛОТАЯ ПОРА",
-        "description": "Такаэ Окудэра и её друзья — группа школьников, чья жизнь проходит на пороге взросления, любви и выбора пути, где каждый день наполнен мечтами, романтикой и маленькими жизненными откровениями",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/10671298/f990f9f7-7a18-4f84-922f-d161e8a48dce/1920x",
-    },
-    {
-        "title": "ЭТОТ ГЛУПЫЙ СВИН НЕ ПОНИМАЕТ МЕЧТУ ДЕВОЧКИ-ЗАЙКИ",
-        "description": "История о настойчивой девочке-зайке и её непонимающем спутнике, где через комичные ситуации, недопонимания и простую заботу раскрывается дружба, поддержка и стремление к мечте.",
-        "photo_url": "https://avatars.mds.yandex.net/get-kinopoisk-image/1629390/1bbdd343-6620-483f-8ce3-95438da543f4/1920x",
-    },
-   
-]
+    services = application.bot_data["services"]
+    # Commands and the menu button are per-bot, so only the first shard registers them.
+    if services.config.shard == 0:
+        await application.bot.set_my_commands(
+            [
+                BotCommand("start", "Запустить бота"),
+                BotCommand("help", "Показать помощь"),
+                BotCommand("anime", "Посоветовать аниме"),
+                BotCommand("find", "Найти аниме по названию"),
+                BotCommand("similar", "Похожее на аниме"),
+                BotCommand("game", "Игра"),
+                BotCommand("top", "Таблица лидеров"),
+                BotCommand("stats", "Моя статистика"),
+                BotCommand("subscribe", "Аниме дня каждый день"),
+                BotCommand("unsubscribe", "Отписаться от аниме дня"),
+                BotCommand("photoid", "Получить file_id фото"),
+            ]
+        )
+        await application.bot.set_chat_menu_button(menu_button=MenuButtonCommands())
+    # run_polling calls post_init before the Application is running, so background work is
+    # started as plain asyncio tasks and cancelled again in post_shutdown.
+    services.start_background()
+    services.start_daily(lambda day: daily_broadcast(application.bot, services, day))
+    services.start_metrics()
+
+
+async def post_shutdown(application: Application) -> None:
+    await application.bot_data["services"].aclose()
 
 def main_reply_markup() -> ReplyKeyboardMarkup:
     keyboard = [
@@ -364,18 +77,22 @@ def main_reply_markup() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
+NEW_RIDDLE_BUTTON = "🔄 Новая загадка"
+EXIT_GAME_BUTTON = "⛔ Выход"
+
+
 def emoji_game_reply_markup(options: list[str]) -> ReplyKeyboardMarkup:
     keyboard = [
         [KeyboardButton(options[0]), KeyboardButton(options[1])],
         [KeyboardButton(options[2]), KeyboardButton(options[3])],
-        [KeyboardButton("🔄 Новая загадка"), KeyboardButton("⛔ Выход")],
+        [KeyboardButton(NEW_RIDDLE_BUTTON), KeyboardButton(EXIT_GAME_BUTTON)],
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
 async def emoji_game_next_round(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    titles = [item.get("title") for item in anime_list if item.get("title")]
-    if len(titles) < 4 or not emoji_game_list:
+    game_index = _services(context).catalogs.current.game
+    if not game_index:
         await update.effective_message.reply_text("Список для игры пока не готов.", reply_markup=main_reply_markup())
         return
 
@@ -387,35 +104,26 @@ async def emoji_game_next_round(update: Update, context: ContextTypes.DEFAULT_TY
     total = int(state.get("total", 5))
     current_round = int(state.get("round", 0))
     score = int(state.get("score", 0))
-    used_answers = state.get("used_answers", [])
+    used_answers = set(state.get("used_answers", ()))
 
     if current_round >= total:
         context.chat_data.pop("emoji_game", None)
+        user = update.effective_user
+        if user is not None:
+            _services(context).stats.record_game(update.effective_chat.id, {user.id: user.full_name})
         await update.effective_message.reply_text(f"Игра окончена! Счёт: {score}/{total}", reply_markup=main_reply_markup())
         return
 
     current_round += 1
     state["round"] = current_round
 
-    candidates = [item for item in emoji_game_list if item.get("answer") in titles and item.get("answer") not in used_answers]
-    if not candidates:
-        candidates = [item for item in emoji_game_list if item.get("answer") in titles]
-    if not candidates:
-        await update.effective_message.reply_text("Список для игры пока не готов.", reply_markup=main_reply_markup())
-        return
-
-    round_item = random.choice(candidates)
-    answer = round_item["answer"]
-    distractors = [t for t in titles if t != answer]
-    if len(distractors) < 3:
-        await update.effective_message.reply_text("Список для игры пока не готов.", reply_markup=main_reply_markup())
-        return
-
-    options = random.sample(distractors, k=3) + [answer]
-    random.shuffle(options)
-    used_answers.append(answer)
+    answer = game_index.pick_answer(used_answers)
+    round_item = game_index.pick_item(answer)
+    options = game_index.pick_options(answer)
+    used_answers.add(answer)
     state["used_answers"] = used_answers
     state["answer"] = answer
+    state["emoji"] = round_item["emoji"]
     state["options"] = options
 
     await update.effective_message.reply_text(
@@ -425,40 +133,269 @@ async def emoji_game_next_round(update: Update, context: ContextTypes.DEFAULT_TY
 
 
 async def start_emoji_game(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    context.chat_data["emoji_game"] = {"round": 0, "score": 0, "total": 5, "used_answers": []}
+    if update.effective_chat.type in (ChatType.GROUP, ChatType.SUPERGROUP):
+        await start_group_game(update, context)
+        return
+    context.chat_data["emoji_game"] = {"round": 0, "score": 0, "total": 5, "used_answers": set()}
     await emoji_game_next_round(update, context)
 
 
-async def emoji_game_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    message = update.effective_message
-    if not message or not getattr(message, "text", None):
+async def skip_riddle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if context.chat_data["emoji_game"].get("mode") == "group":
+        await skip_group_riddle(update, context)
         return
+    await emoji_game_next_round(update, context)
+
 
+async def exit_emoji_game(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     state = context.chat_data.get("emoji_game")
-    if not state:
+    if state and state.get("mode") == "group":
+        await exit_group_game(update, context)
         return
+    context.chat_data.pop("emoji_game", None)
+    await update.effective_message.reply_text("Ок, выходим из игры.", reply_markup=main_reply_markup())
 
-    text = message.text.strip()
-    if text == "🔄 Новая загадка":
-        await emoji_game_next_round(update, context)
-        return
 
-    if text == "⛔ Выход":
-        context.chat_data.pop("emoji_game", None)
-        await message.reply_text("Ок, выходим из игры.", reply_markup=main_reply_markup())
+async def emoji_game_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Only reached through TextRouter while a game is running in this chat.
+    message = update.effective_message
+    state = context.chat_data["emoji_game"]
+    if state.get("mode") == "group":
+        await group_game_answer(update, context)
         return
-
-    options = state.get("options", [])
-    if text not in options:
+    text = message.text.strip()
+    if text not in state.get("options", ()):
         return
 
-    if text == state.get("answer"):
+    correct = text == state.get("answer")
+    user = update.effective_user
+    if user is not None:
+        _services(context).stats.record_answer(
+            update.effective_chat.id, user.id, user.full_name, state["answer"], state.get("emoji", ""), correct
+        )
+    if correct:
         state["score"] = int(state.get("score", 0)) + 1
         await message.reply_text("Верно! 🎉")
         await emoji_game_next_round(update, context)
     else:
         await message.reply_text("Неа 🙈 Попробуй ещё раз или нажми «🔄 Новая загадка».")
 
+GROUP_GAME_ROUNDS = 10
+# Wrong answers in a group are collected into one message per round, updated at most every
+# FEEDBACK_DEBOUNCE seconds and at most FEEDBACK_MAX_UPDATES times.
+FEEDBACK_DEBOUNCE = 3.0
+FEEDBACK_MAX_UPDATES = 5
+FEEDBACK_MAX_NAMES = 10
+# Skips pressed within this many seconds of a round's start are ignored, so several members
+# pressing "new riddle" on the same riddle skip it once.
+GROUP_SKIP_DEBOUNCE = 3.0
+
+
+# In a group every member's guess is an update for the same chat, and ChatOrderedUpdateProcessor
+# runs them one after another. Group handlers therefore never wait for Telegram: each one applies
+# its state change without an await in between (so the first correct answer wins and the round
+# moves on exactly once) and hands the resulting message to a background task. Wrong answers only
+# update a per-round tally that a debounced task renders into a single, edited message.
+def _group_round(state: dict, game_index: GameIndex) -> str:
+    used_answers = set(state.get("used_answers", ()))
+    answer = game_index.pick_answer(used_answers)
+    round_item = game_index.pick_item(answer)
+    used_answers.add(answer)
+    state.update(
+        round=int(state.get("round", 0)) + 1,
+        used_answers=used_answers,
+        answer=answer,
+        emoji=round_item["emoji"],
+        options=game_index.pick_options(answer),
+        misses=0,
+        wrong={},
+        feedback={"message_id": None, "updates": 0},
+        started_at=time.time(),
+    )
+    return (
+        f"Раунд {state['round']}/{state['total']}\n\nУгадай аниме по эмодзи:\n\n{round_item['emoji']}\n\n"
+        "У каждого одна попытка. Кто первым ответит правильно, получит очко!"
+    )
+
+
+def _scoreboard(state: dict) -> str:
+    scores = sorted(state.get("scores", {}).values(), key=lambda entry: -entry[1])
+    if not scores:
+        return "Никто не набрал очков."
+    return "\n".join(f"{place}. {name} — {points}" for place, (name, points) in enumerate(scores, 1))
+
+
+def _send_later(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, reply_markup: ReplyKeyboardMarkup) -> None:
+    context.application.create_task(
+        context.bot.send_message(update.effective_chat.id, text, reply_markup=reply_markup), update=update
+    )
+
+
+def _finish_group_game(update: Update, context: ContextTypes.DEFAULT_TYPE, state: dict, headline: str) -> None:
+    players = {int(user_id): name for user_id, name in state.get("players", {}).items()}
+    if players:
+        _services(context).stats.record_game(update.effective_chat.id, players)
+    _send_later(update, context, f"{headline}\n\n🏆 Итоги:\n{_scoreboard(state)}", main_reply_markup())
+
+
+def _next_group_round(update: Update, context: ContextTypes.DEFAULT_TYPE, state: dict, headline: str) -> None:
+    if state.get("misses"):
+        headline += f" (неверных ответов: {state['misses']})"
+    if int(state["round"]) >= int(state["total"]):
+        context.chat_data.pop("emoji_game", None)
+        _finish_group_game(update, context, state, f"{headline}\n\nИгра окончена!")
+        return
+    riddle = _group_round(state, _services(context).catalogs.current.game)
+    _send_later(update, context, f"{headline}\n\n{riddle}", emoji_game_reply_markup(state["options"]))
+
+
+async def start_group_game(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    game_index = _services(context).catalogs.current.game
+    if not game_index:
+        await update.effective_message.reply_text("Список для игры пока не готов.", reply_markup=main_reply_markup())
+        return
+
+    user = update.effective_user
+    state = {
+        "mode": "group",
+        "round": 0,
+        "total": GROUP_GAME_ROUNDS,
+        "scores": {},
+        "players": {},
+        "started_by": user.id if user is not None else None,
+    }
+    context.chat_data["emoji_game"] = state
+    riddle = _group_round(state, game_index)
+    await update.effective_message.reply_text(
+        f"Групповая игра! {GROUP_GAME_ROUNDS} раундов. Остановить её может только тот, кто её начал.\n\n{riddle}",
+        reply_markup=emoji_game_reply_markup(state["options"]),
+    )
+
+
+async def skip_group_riddle(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    state = context.chat_data["emoji_game"]
+    # Presses that arrive right after a round started were meant for the riddle it replaced.
+    if time.time() - float(state.get("started_at", 0)) < GROUP_SKIP_DEBOUNCE:
+        return
+    _next_group_round(update, context, state, f"⏭ Пропускаем. Это было: {state['answer']}")
+
+
+async def exit_group_game(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    state = context.chat_data["emoji_game"]
+    # Only the member who started the game can stop it for everyone.
+    starter = state.get("started_by")
+    user = update.effective_user
+    if starter is not None and (user is None or user.id != starter):
+        return
+    context.chat_data.pop("emoji_game", None)
+    _finish_group_game(update, context, state, "Игра остановлена.")
+
+
+async def group_game_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    state = context.chat_data["emoji_game"]
+    text = update.effective_message.text.strip()
+    user = update.effective_user
+    # Answers to an earlier round's keyboard that are not options of this round are ignored.
+    if user is None or text not in state.get("options", ()):
+        return
+
+    user_key = str(user.id)
+    # One guess per player and round: after a miss, further answers are ignored until the next round.
+    if user_key in state["wrong"]:
+        return
+    correct = text == state["answer"]
+    state["players"][user_key] = user.full_name
+    _services(context).stats.record_answer(
+        update.effective_chat.id, user.id, user.full_name, state["answer"], state["emoji"], correct
+    )
+    if not correct:
+        state["misses"] += 1
+        state["wrong"][user_key] = user.first_name
+        _schedule_feedback(context, update.effective_chat.id, state["round"])
+        return
+
+    entry = state["scores"].setdefault(user_key, [user.full_name, 0])
+    entry[0] = user.full_name
+    entry[1] += 1
+    _next_group_round(update, context, state, f"✅ {user.full_name} угадывает: {state['answer']}!")
+
+
+def _schedule_feedback(context: ContextTypes.DEFAULT_TYPE, chat_id: int, round_number: int) -> None:
+    # One feedback task per chat and round; tasks live in bot_data, which is never persisted.
+    tasks = context.bot_data.setdefault("feedback_tasks", {})
+    running = tasks.get(chat_id)
+    if running is not None and running[0] == round_number and not running[1].done():
+        return
+    if context.chat_data["emoji_game"]["feedback"]["updates"] >= FEEDBACK_MAX_UPDATES:
+        return
+    tasks[chat_id] = (round_number, context.application.create_task(_flush_feedback(context, chat_id, round_number)))
+
+
+async def _flush_feedback(context: ContextTypes.DEFAULT_TYPE, chat_id: int, round_number: int) -> None:
+    chat_data = context.application.chat_data[chat_id]
+    try:
+        while True:
+            await asyncio.sleep(FEEDBACK_DEBOUNCE)
+            state = chat_data.get("emoji_game")
+            # Once the round is over its misses are summed up in the next round's message.
+            if not state or state.get("round") != round_number:
+                return
+
+            feedback = state["feedback"]
+            misses = state["misses"]
+            names = list(state["wrong"].values())
+            text = f"Неа 🙈 Неверных ответов: {misses}\nМимо: " + ", ".join(names[:FEEDBACK_MAX_NAMES])
+            if len(names) > FEEDBACK_MAX_NAMES:
+                text += f" и ещё {len(names) - FEEDBACK_MAX_NAMES}"
+
+            feedback["updates"] += 1
+            if feedback["message_id"] is None:
+                sent = await context.bot.send_message(chat_id, text)
+                feedback["message_id"] = sent.message_id
+            else:
+                await context.bot.edit_message_text(text, chat_id, feedback["message_id"])
+
+            # Misses that came in while this message was on its way get one more update.
+            if (
+                chat_data.get("emoji_game") is not state
+                or state.get("round") != round_number
+                or state["misses"] == misses
+                or feedback["updates"] >= FEEDBACK_MAX_UPDATES
+            ):
+                return
+    finally:
+        tasks = context.bot_data.get("feedback_tasks", {})
+        if tasks.get(chat_id, (None, None))[1] is asyncio.current_task():
+            del tasks[chat_id]
+
+async def top(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    ranking = _services(context).stats.ranking
+    if not ranking.players:
+        await update.effective_message.reply_text("Пока никто не играл. Начни первым: /game")
+        return
+
+    lines = ["🏆 Лучшие игроки:"]
+    for place, (name, correct, answers, best_streak) in enumerate(ranking.players, 1):
+        lines.append(f"{place}. {name} — {correct} верных из {answers} ({correct * 100 // max(answers, 1)}%), серия {best_streak}")
+    if ranking.puzzles:
+        lines.append("\n🧩 Самые сложные загадки:")
+        for emoji, answer, attempts, correct in ranking.puzzles:
+            lines.append(f"{emoji} — угадали {correct} из {attempts}")
+    await update.effective_message.reply_text("\n".join(lines))
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    row = _services(context).stats.player(update.effective_user.id)
+    if row is None:
+        await update.effective_message.reply_text("У тебя пока нет статистики. Сыграй: /game")
+        return
+
+    games, answers, correct, streak, best_streak = row
+    await update.effective_message.reply_text(
+        f"Игр сыграно: {games}\n"
+        f"Ответов: {answers}, верных {correct} ({correct * 100 // max(answers, 1)}%)\n"
+        f"Текущая серия: {streak}, лучшая: {best_streak}"
+    )
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     reply_markup = main_reply_markup()
     await update.effective_message.reply_text(
@@ -476,62 +413,272 @@ async def help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                     " /start - Запустить бота\n"
                                     " /help - Показать это сообщение\n"
                                     " /anime - Получить рекомендацию аниме\n"
-                                    " /game - Играть в увлекательную игру с аниме")
+                                    " /find <название> - Найти аниме\n"
+                                    " /similar <название> - Похожие аниме\n"
+                                    " /game - Играть в увлекательную игру с аниме (в группе — все против всех)\n"
+                                    " /top - Таблица лидеров\n"
+                                    " /stats - Моя статистика в игре\n"
+                                    " /subscribe - Получать аниме дня\n"
+                                    " /unsubscribe - Отписаться от аниме дня")
 
 async def aiky(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.effective_message.reply_text(random.choice(aiky_messages))
+    await update.effective_message.reply_text(random.choice(_services(context).catalogs.current.aiky_messages))
+
+LIKED_HISTORY = 10
+# Share of /anime picks steered by the chat's searches, and how far ahead in the chat's cycle a
+# steered pick may reach.
+PREFERENCE_SHARE = 1 / 3
+PREFERENCE_LOOKAHEAD = 64
+
+
+def _remember_liked(context: ContextTypes.DEFAULT_TYPE, title: str) -> None:
+    liked = [liked for liked in context.chat_data.get("liked", ()) if liked != title]
+    liked.append(title)
+    context.chat_data["liked"] = liked[-LIKED_HISTORY:]
+
+
+# A cycle is {seed, pos, size, taken}: the permutation of range(size) is computed per step, so a
+# chat holds a few ints. A cycle keeps the size it started with, so titles appended to the catalog
+# join the next cycle instead of resetting the current one. "taken" holds positions ahead of pos
+# that a steered pick has already shown; the cycle skips them when it gets there.
+def _anime_cycle(context: ContextTypes.DEFAULT_TYPE, size: int) -> dict:
+    state = context.chat_data.get("anime_cycle")
+    if not isinstance(state, dict) or "seed" not in state:
+        state = context.chat_data["anime_cycle"] = {"seed": random.getrandbits(32), "pos": 0, "size": size}
+    if int(state.get("pos", 0)) >= int(state.get("size", 0)):
+        state.update(seed=random.getrandbits(32), pos=0, size=size, taken=[])
+    state.setdefault("taken", [])
+    return state
+
+
+def _next_in_cycle(context: ContextTypes.DEFAULT_TYPE, anime_list: list[dict]) -> dict:
+    while True:
+        state = _anime_cycle(context, len(anime_list))
+        pos = int(state["pos"])
+        state["pos"] = pos + 1
+        if pos in state["taken"]:
+            state["taken"].remove(pos)
+            continue
+        idx = permute(pos, int(state["size"]), int(state["seed"]))
+        # Titles removed from the catalog since the cycle started are skipped.
+        if idx < len(anime_list):
+            return anime_list[idx]
+
+
+def _pick_for_chat(context: ContextTypes.DEFAULT_TYPE, catalog: Catalog) -> dict | None:
+    # Titles the chat searched for make up its taste profile. Some picks are the title closest to
+    # it among the next few positions of the chat's cycle, so the profile reorders the cycle but
+    # never replaces it: every title is still shown once per cycle.
+    liked = context.chat_data.get("liked", [])
+    if not liked or random.random() >= PREFERENCE_SHARE:
+        return None
+    profile = catalog.recommend.profile(liked)
+    if profile is None:
+        return None
+
+    anime_list = catalog.anime
+    state = _anime_cycle(context, len(anime_list))
+    pos, size, seed = int(state["pos"]), int(state["size"]), int(state["seed"])
+    ahead = [
+        (position, anime_list[idx])
+        for position in range(pos, min(pos + PREFERENCE_LOOKAHEAD, size))
+        if position not in state["taken"] and (idx := permute(position, size, seed)) < len(anime_list)
+    ]
+    ahead = [(position, item) for position, item in ahead if item.get("title") not in liked]
+    best = catalog.recommend.closest(profile, [item.get("title", "") for _, item in ahead])
+    if best is None:
+        return None
+    position, item = ahead[best]
+    state["taken"].append(position)
+    return item
+
 
 async def anime(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    services = _services(context)
+    catalog = services.catalogs.current
+    anime_list = catalog.anime
     if not anime_list:
         await update.effective_message.reply_text("В списке пока нет аниме.")
         return
 
-    state = context.chat_data.get("anime_cycle")
-    if not state or not isinstance(state, dict) or int(state.get("size", 0)) != len(anime_list):
-        order = list(range(len(anime_list)))
-        random.shuffle(order)
-        state = {"order": order, "pos": 0, "size": len(anime_list)}
-        context.chat_data["anime_cycle"] = state
-
-    order = state.get("order")
-    if not isinstance(order, list) or len(order) != len(anime_list):
-        order = list(range(len(anime_list)))
-        random.shuffle(order)
-        state["order"] = order
-        state["pos"] = 0
-        state["size"] = len(anime_list)
-
-    pos = int(state.get("pos", 0))
-    if pos >= len(order):
-        random.shuffle(order)
-        pos = 0
-
-    idx = int(order[pos])
-    state["pos"] = pos + 1
-
-    random_anime = anime_list[idx]
-    title = random_anime.get("title", "Аниме")
-    description = random_anime.get("description", "")
-    caption = f"Вот это аниме я советую посмотреть сегодня вечером:\n\n{title}\n\n{description}".strip()
-
-    photo_url = random_anime.get("photo_url")
-    if not photo_url and title:
-        photo_url = await asyncio.to_thread(_fetch_anilist_cover_url, title)
+    item = _pick_for_chat(context, catalog)
+    if item is not None:
+        caption = _anime_caption(item, "Судя по твоим поискам, тебе может понравиться:")
+        await _send_anime(update.effective_message, services, item, caption)
+        return
 
-    if photo_url:
-        try:
-            if len(caption) <= 1024:
-                await update.effective_message.reply_photo(photo=photo_url, caption=caption)
-                return
+    random_anime = _next_in_cycle(context, anime_list)
+    caption = _anime_caption(random_anime, "Вот это аниме я советую посмотреть сегодня вечером:")
+    await _send_anime(update.effective_message, services, random_anime, caption)
 
-            short_caption = caption[:1024]
-            await update.effective_message.reply_photo(photo=photo_url, caption=short_caption)
-            await update.effective_message.reply_text(caption[1024:])
+def _anime_caption(item: dict, intro: str) -> str:
+    title = item.get("title", "Аниме")
+    description = item.get("description", "")
+    return f"{intro}\n\n{title}\n\n{description}".strip()
+
+async def _photo_candidates(services: BotServices, item: dict) -> tuple[str | None, str | None, list[str | bytes]]:
+    # Returns (photo_url, cached file_id, photos to try in order).
+    title = item.get("title", "Аниме")
+    photo_url = item.get("photo_url")
+    if not photo_url and title:
+        photo_url = await _fetch_anilist_cover_url(services, title)
+    if not photo_url:
+        return None, None, []
+
+    # A file_id from an earlier send lets Telegram skip downloading the remote image again.
+    file_id = services.file_ids.get(photo_url)
+    candidates: list[str | bytes] = [file_id] if file_id else []
+    if not file_id and photo_url.startswith(("http://", "https://")):
+        # Otherwise upload the pre-resized local copy, which is smaller than the remote original.
+        image = services.images.get(photo_url)
+        if image is not None:
+            candidates.append(image)
+        else:
+            services.images.schedule(photo_url)
+    candidates.append(photo_url)
+    return photo_url, file_id, candidates
+
+async def _send_anime(message: Message, services: BotServices, item: dict, caption: str) -> None:
+    photo_url, file_id, candidates = await _photo_candidates(services, item)
+    if photo_url:
+        for photo in candidates:
+            try:
+                sent = await message.reply_photo(photo=photo, caption=caption[:1024])
+            except BadRequest:
+                # Only a photo Telegram rejects moves on to the next candidate; timeouts, network
+                # errors and blocked chats propagate instead of sending the photo twice or retrying
+                # a chat that cannot be reached.
+                if photo == file_id:
+                    services.file_ids.discard(photo_url)
+                continue
+
+            if photo != file_id and sent.photo:
+                services.file_ids.set(photo_url, sent.photo[-1].file_id)
+            if len(caption) > 1024:
+                await message.reply_text(caption[1024:])
             return
-        except Exception:
-            pass
 
-    await update.effective_message.reply_text(caption)
+    await message.reply_text(caption)
+
+DAILY_PICK_SEED = 0x616E6964
+
+
+def _anime_of_the_day(catalog: Catalog, day: datetime.date) -> dict | None:
+    # The same day always maps to the same title, in every process and after a restart.
+    if not catalog.anime:
+        return None
+    size = len(catalog.anime)
+    return catalog.anime[permute(day.toordinal() % size, size, DAILY_PICK_SEED)]
+
+async def daily_broadcast(bot: Bot, services: BotServices, day: datetime.date) -> None:
+    catalog = services.catalogs.current
+    started = services.broadcasts.day(day)
+    # A resumed broadcast keeps the title it started with, even if the catalog changed since.
+    item = catalog.by_title.get(started[0]) if started else None
+    item = item or _anime_of_the_day(catalog, day)
+    if item is None:
+        return
+    services.broadcasts.begin(day, item["title"])
+
+    caption = _anime_caption(item, "🌟 Аниме дня:")
+    photo_url, _, candidates = await _photo_candidates(services, item)
+
+    async def send(chat_id: int, file_id: str | None) -> str | None:
+        # A file_id Telegram no longer accepts falls back to uploading the photo again.
+        for photo in dict.fromkeys([file_id, *candidates] if file_id else candidates):
+            try:
+                sent = await bot.send_photo(chat_id, photo, caption=caption[:1024], rate_limit_args=PRIORITY_BULK)
+            except BadRequest as exc:
+                if "chat not found" in exc.message.lower():
+                    raise
+                continue
+
+            received = sent.photo[-1].file_id if sent.photo else None
+            if received and received != file_id:
+                services.file_ids.set(photo_url, received)
+            if len(caption) > 1024:
+                await bot.send_message(chat_id, caption[1024:], rate_limit_args=PRIORITY_BULK)
+            return received
+
+        await bot.send_message(chat_id, caption, rate_limit_args=PRIORITY_BULK)
+        return None
+
+    await services.broadcasts.fan_out(day, send)
+
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if _services(context).broadcasts.subscribe(update.effective_chat.id):
+        await update.effective_message.reply_text("Готово! Каждый день буду присылать сюда аниме дня 🌟")
+    else:
+        await update.effective_message.reply_text("Этот чат уже подписан на аниме дня.")
+
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if _services(context).broadcasts.unsubscribe([update.effective_chat.id]):
+        await update.effective_message.reply_text("Ок, больше не присылаю аниме дня.")
+    else:
+        await update.effective_message.reply_text("Этот чат и не был подписан.")
+
+async def find(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = " ".join(context.args or [])
+    if not query:
+        await update.effective_message.reply_text("Напиши название после команды, например: /find наруто")
+        return
+
+    services = _services(context)
+    found = services.catalogs.current.search.search(query)
+    if not found:
+        await update.effective_message.reply_text("Ничего не нашёл 🙈 Попробуй написать название иначе.")
+        return
+
+    _remember_liked(context, found[0]["title"])
+    caption = _anime_caption(found[0], "Вот что я нашёл:")
+    if len(found) > 1:
+        caption += "\n\nЕщё похоже: " + ", ".join(item["title"] for item in found[1:])
+    await _send_anime(update.effective_message, services, found[0], caption)
+
+async def similar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = " ".join(context.args or [])
+    if not query:
+        await update.effective_message.reply_text("Напиши название после команды, например: /similar наруто")
+        return
+
+    services = _services(context)
+    catalog = services.catalogs.current
+    found = catalog.search.search(query, limit=1)
+    recommended = catalog.recommend.similar(found[0]["title"]) if found else []
+    if not recommended:
+        await update.effective_message.reply_text("Ничего не нашёл 🙈 Попробуй написать название иначе.")
+        return
+
+    title = found[0]["title"]
+    _remember_liked(context, title)
+    caption = _anime_caption(recommended[0], f"Если понравилось «{title}», посмотри:")
+    if len(recommended) > 1:
+        caption += "\n\nЕщё похоже: " + ", ".join(item["title"] for item in recommended[1:])
+    await _send_anime(update.effective_message, services, recommended[0], caption)
+
+async def inline_find(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    services = _services(context)
+    results = []
+    for index, item in enumerate(services.catalogs.current.search.search(update.inline_query.query)):
+        title = item["title"]
+        caption = _anime_caption(item, "Советую посмотреть:")
+        photo_url = item.get("photo_url") or ""
+        # A cached file_id lets Telegram reuse the uploaded photo instead of fetching the URL.
+        file_id = services.file_ids.get(photo_url) if photo_url else None
+        if file_id:
+            results.append(InlineQueryResultCachedPhoto(str(index), file_id, title=title, caption=caption[:1024]))
+        elif photo_url.startswith(("http://", "https://")):
+            results.append(InlineQueryResultPhoto(str(index), photo_url, photo_url, title=title, caption=caption[:1024]))
+        else:
+            results.append(
+                InlineQueryResultArticle(
+                    str(index),
+                    title,
+                    InputTextMessageContent(caption[:4096]),
+                    description=item.get("description", "")[:100],
+                )
+            )
+    await update.inline_query.answer(results, cache_time=300)
 
 async def photoid(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message = update.effective_message
@@ -547,17 +694,68 @@ async def photoid(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def game(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await start_emoji_game(update, context)
 
-app.add_handler(CommandHandler("start", start))
-app.add_handler(CommandHandler("help", help))
-app.add_handler(CommandHandler("anime", anime))
-app.add_handler(CommandHandler("game", game))
-app.add_handler(MessageHandler(filters.TEXT & filters.Regex("^Start$"), start))
-app.add_handler(MessageHandler(filters.TEXT & filters.Regex("^Aiky$"), aiky))
-app.add_handler(MessageHandler(filters.TEXT & filters.Regex("^Help$"), help))
-app.add_handler(MessageHandler(filters.TEXT & filters.Regex("^Anime$"), anime))
-app.add_handler(MessageHandler(filters.TEXT & filters.Regex("^Game$"), game))
-app.add_handler(MessageHandler(filters.PHOTO & filters.CaptionRegex(r"^/photoid(@\\w+)?$"), photoid))
-app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, emoji_game_message), group=1)
-
-
-app.run_polling()
+def add_handlers(application: Application) -> None:
+    start_handler = instrument("start", start)
+    help_handler = instrument("help", help)
+    anime_handler = instrument("anime", anime)
+    game_handler = instrument("game", game)
+    application.add_handler(CommandHandler("start", start_handler))
+    application.add_handler(CommandHandler("help", help_handler))
+    application.add_handler(CommandHandler("anime", anime_handler))
+    application.add_handler(CommandHandler("game", game_handler))
+    application.add_handler(CommandHandler("find", instrument("find", find)))
+    application.add_handler(CommandHandler("similar", instrument("similar", similar)))
+    application.add_handler(CommandHandler("top", instrument("top", top)))
+    application.add_handler(CommandHandler("subscribe", instrument("subscribe", subscribe)))
+    application.add_handler(CommandHandler("unsubscribe", instrument("unsubscribe", unsubscribe)))
+    application.add_handler(CommandHandler("stats", instrument("stats", stats)))
+    application.add_handler(InlineQueryHandler(instrument("inline_find", inline_find)))
+    application.add_handler(MessageHandler(filters.PHOTO & filters.CaptionRegex(r"^/photoid(@\\w+)?$"), instrument("photoid", photoid)))
+    router = TextRouter(
+        buttons={
+            "Start": start_handler,
+            "Aiky": instrument("aiky", aiky),
+            "Help": help_handler,
+            "Anime": anime_handler,
+            "Game": game_handler,
+        },
+        game_buttons={
+            NEW_RIDDLE_BUTTON: instrument("emoji_game", skip_riddle),
+            EXIT_GAME_BUTTON: instrument("emoji_game", exit_emoji_game),
+        },
+        game_answer=instrument("emoji_game", emoji_game_answer),
+    )
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, router))
+
+
+def create_app(config: Config, services: BotServices | None = None) -> Application:
+    services = services or BotServices(config)
+    builder = (
+        Application.builder()
+        .token(config.token)
+        .concurrent_updates(ChatOrderedUpdateProcessor(config.concurrent_updates))
+        .rate_limiter(SendScheduler(budget=services.send_budget))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if config.persistence:
+        builder = builder.persistence(
+            open_persistence(config.db_path, config.persistence_interval, config.shard, config.workers)
+        )
+    # Webhook servers and shard workers get their updates from outside PTB's Updater.
+    if config.webhook_url or config.workers > 1:
+        builder = builder.updater(None)
+
+    application = builder.build()
+    application.bot_data["services"] = services
+    add_handlers(application)
+    # list() copies the chat ids in one step, so the metrics thread never iterates a dict the
+    # event loop is resizing.
+    ACTIVE_GAMES.set_function(lambda: sum(1 for data in list(application.chat_data.values()) if "emoji_game" in data))
+    return application
+
+
+if __name__ == "__main__":
+    from cli import main
+
+    main()
@@ -0,0 +1,118 @@
+import asyncio
+import importlib.util
+import os
+import time
+
+import httpx
+
+from metrics import ANILIST_ERRORS, ANILIST_SECONDS
+
+ANILIST_ENDPOINT = os.environ.get("ANILIST_ENDPOINT", "https://graphql.anilist.co")
+
+ANILIST_MAX_CONNECTIONS = int(os.environ.get("ANILIST_MAX_CONNECTIONS", "10"))
+ANILIST_MAX_KEEPALIVE = int(os.environ.get("ANILIST_MAX_KEEPALIVE", "5"))
+ANILIST_MAX_CONCURRENCY = int(os.environ.get("ANILIST_MAX_CONCURRENCY", "4"))
+ANILIST_TIMEOUT = float(os.environ.get("ANILIST_TIMEOUT", "8"))
+ANILIST_BATCH_SIZE = int(os.environ.get("ANILIST_BATCH_SIZE", "25"))
+
+COVER_QUERY = """
+query ($search: String) {
+  Media(search: $search, type: ANIME) {
+    coverImage {
+      extraLarge
+      large
+    }
+  }
+}
+""".strip()
+
+COVER_FIELDS = "coverImage { extraLarge large }"
+
+
+class AniListError(Exception):
+    pass
+
+
+def _extract_cover_url(media: object) -> str | None:
+    if not isinstance(media, dict):
+        return None
+
+    cover = media.get("coverImage")
+    if not isinstance(cover, dict):
+        return None
+
+    url = cover.get("extraLarge") or cover.get("large")
+    if isinstance(url, str) and url:
+        return url
+    return None
+
+
+class AniListClient:
+    def __init__(
+        self,
+        endpoint: str = ANILIST_ENDPOINT,
+        max_connections: int = ANILIST_MAX_CONNECTIONS,
+        max_keepalive: int = ANILIST_MAX_KEEPALIVE,
+        max_concurrency: int = ANILIST_MAX_CONCURRENCY,
+        timeout: float = ANILIST_TIMEOUT,
+    ) -> None:
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=httpx.Timeout(self.timeout),
+                # HTTP/2 needs the optional h2 package; fall back to pooled HTTP/1.1 without it.
+                http2=importlib.util.find_spec("h2") is not None,
+                headers={"Content-Type": "application/json", "Accept": "application/json"},
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def query(self, query: str, variables: dict | None = None) -> dict:
+        started = time.perf_counter()
+        try:
+            # The deadline covers waiting for a concurrency slot as well as the request itself.
+            async with asyncio.timeout(self.timeout), self._semaphore:
+                resp = await self.client.post(self.endpoint, json={"query": query, "variables": variables or {}})
+                # AniList answers an unknown title with 404 and "Media": null, which is a real answer.
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    resp.raise_for_status()
+                payload = resp.json()
+            ANILIST_SECONDS.observe(time.perf_counter() - started)
+        except (httpx.HTTPError, TimeoutError, ValueError) as exc:
+            ANILIST_ERRORS.inc(type(exc).__name__)
+            raise AniListError(f"AniList request failed: {exc!r}") from exc
+
+        if not isinstance(payload, dict):
+            raise AniListError("AniList returned a non-object payload")
+        data = payload.get("data")
+        if not isinstance(data, dict):
+            return {}
+        return data
+
+    async def fetch_cover_url(self, title: str) -> str | None:
+        data = await self.query(COVER_QUERY, {"search": title})
+        return _extract_cover_url(data.get("Media"))
+
+    async def fetch_cover_urls(self, titles: list[str]) -> dict[str, str | None]:
+        # One aliased Media(search:) field per title, so a whole batch costs a single round-trip.
+        params = ", ".join(f"$s{i}: String" for i in range(len(titles)))
+        fields = " ".join(
+            f"m{i}: Media(search: $s{i}, type: ANIME) {{ {COVER_FIELDS} }}" for i in range(len(titles))
+        )
+        data = await self.query(
+            f"query ({params}) {{ {fields} }}",
+            {f"s{i}": title for i, title in enumerate(titles)},
+        )
+        return {title: _extract_cover_url(data.get(f"m{i}")) for i, title in enumerate(titles)}
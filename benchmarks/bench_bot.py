@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from telegram import Update
+from telegram.ext import Application
+
+import Anitine_bot as bot
+from benchmarks.fakes import FakeUpstreams, write_catalog
+from config import Config
+from ratelimit import SendScheduler
+from services import BotServices
+from updates import ChatOrderedUpdateProcessor
+
+
+def _deep_size(value: object, seen: set[int] | None = None) -> int:
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in value)
+    return size
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Workload:
+    def __init__(self) -> None:
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        return {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+                **fields,
+            },
+        }
+
+    def command(self, chat_id: int, command: str) -> dict:
+        return self._message(
+            chat_id, text=command, entities=[{"type": "bot_command", "offset": 0, "length": len(command)}]
+        )
+
+    def text(self, chat_id: int, text: str) -> dict:
+        return self._message(chat_id, text=text)
+
+    def photo(self, chat_id: int) -> dict:
+        file_id = f"upload-{chat_id}-{next(self._message_ids)}"
+        return self._message(
+            chat_id,
+            caption="/photoid",
+            photo=[{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480}],
+        )
+
+
+async def run(args: argparse.Namespace) -> None:
+    upstreams = FakeUpstreams(
+        bot_latency=args.bot_latency,
+        bot_error_rate=args.bot_error_rate,
+        anilist_latency=args.anilist_latency,
+        anilist_error_rate=args.anilist_error_rate,
+        anilist_miss_rate=args.anilist_miss_rate,
+    ).start()
+
+    workdir = tempfile.mkdtemp(prefix="anitime-bench-")
+    catalog_path = os.path.join(workdir, "catalog.json")
+    write_catalog(catalog_path, args.titles, args.photo_share, upstreams.base_url)
+    config = Config(
+        token="1:bench",
+        db_path=os.path.join(workdir, "bench.sqlite3"),
+        catalog_path=catalog_path,
+        anilist_endpoint=f"{upstreams.base_url}/graphql",
+        image_dir=os.path.join(workdir, "images") if args.cover_images else "",
+        persistence=False,
+    )
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    waiters: dict[int, asyncio.Future] = {}
+
+    def kind_of(update: Update) -> str:
+        message = update.effective_message
+        if message is None:
+            return "other"
+        if message.photo:
+            return "/photoid"
+        text = message.text or ""
+        if text.startswith("/"):
+            return text.split()[0]
+        return "game_answer"
+
+    class TimedUpdateProcessor(ChatOrderedUpdateProcessor):
+        __slots__ = ()
+
+        async def do_process_update(self, update: object, coroutine) -> None:
+            async def timed() -> None:
+                started = time.perf_counter()
+                try:
+                    await coroutine
+                finally:
+                    latencies[kind_of(update)].append(time.perf_counter() - started)
+
+            try:
+                await super().do_process_update(update, timed())
+            finally:
+                waiter = waiters.pop(update.update_id, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+
+    builder = (
+        Application.builder()
+        .token(config.token)
+        .base_url(f"{upstreams.base_url}/bot")
+        .base_file_url(f"{upstreams.base_url}/file/bot")
+        .concurrent_updates(TimedUpdateProcessor(args.concurrency))
+        .connection_pool_size(args.concurrency * 2)
+    )
+    if args.rate_limit:
+        builder = builder.rate_limiter(SendScheduler())
+    application = builder.build()
+    services = BotServices(config)
+    application.bot_data["services"] = services
+    bot.add_handlers(application)
+    workload = Workload()
+    errors: Counter[str] = Counter()
+
+    async def count_error(update: object, context) -> None:
+        errors[type(context.error).__name__] += 1
+
+    application.add_error_handler(count_error)
+
+    async def submit(payload: dict) -> None:
+        update = Update.de_json(payload, application.bot)
+        waiters[update.update_id] = asyncio.get_running_loop().create_future()
+        future = waiters[update.update_id]
+        await application.update_queue.put(update)
+        await future
+
+    async def user(chat_id: int) -> None:
+        rng = random.Random(chat_id)
+        for _ in range(args.updates_per_chat):
+            game = application.chat_data.get(chat_id, {}).get("emoji_game")
+            if game and game.get("options"):
+                answer = game["answer"] if rng.random() < 0.6 else rng.choice(game["options"])
+                await submit(workload.text(chat_id, answer))
+                continue
+
+            roll = rng.random()
+            if roll < 0.5:
+                await submit(workload.command(chat_id, "/anime"))
+            elif roll < 0.8:
+                await submit(workload.command(chat_id, "/game"))
+            elif roll < 0.9:
+                await submit(workload.photo(chat_id))
+            else:
+                await submit(workload.command(chat_id, "/start"))
+
+    async with application:
+        await application.start()
+        await bot.post_init(application)
+        if args.warm:
+            await services.prefetch_covers(services.catalogs.current)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(chat_id) for chat_id in range(1, args.chats + 1)))
+        elapsed = time.perf_counter() - started
+
+        chat_bytes = _deep_size(dict(application.chat_data))
+        await application.stop()
+        await bot.post_shutdown(application)
+    upstreams.stop()
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"updates: {total} in {elapsed:.2f}s -> {total / elapsed:.0f} updates/s "
+          f"({args.chats} chats, concurrency {args.concurrency})")
+    print(f"{'handler':<14}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for kind, samples in sorted(latencies.items()):
+        print(f"{kind:<14}{len(samples):>8}{_percentile(samples, 50) * 1000:>10.2f}{_percentile(samples, 99) * 1000:>10.2f}")
+    print(f"chat_data: {chat_bytes / max(1, len(application.chat_data)):.0f} bytes/chat "
+          f"over {len(application.chat_data)} chats")
+    print("handler errors: " + (", ".join(f"{name}={count}" for name, count in sorted(errors.items())) or "none"))
+    print("upstream calls: " + ", ".join(f"{name}={count}" for name, count in sorted(upstreams.calls.items())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test against fake Telegram Bot API and AniList")
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--updates-per-chat", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--titles", type=int, default=5000, help="titles in the generated catalog")
+    parser.add_argument("--photo-share", type=float, default=0.7, help="share of titles with a catalog photo_url")
+    parser.add_argument("--bot-latency", type=float, default=0.005, help="seconds per Bot API call")
+    parser.add_argument("--bot-error-rate", type=float, default=0.0)
+    parser.add_argument("--anilist-latency", type=float, default=0.05, help="seconds per AniList query")
+    parser.add_argument("--anilist-error-rate", type=float, default=0.0)
+    parser.add_argument("--anilist-miss-rate", type=float, default=0.1)
+    parser.add_argument("--rate-limit", action="store_true", help="send through the Telegram rate limiter")
+    parser.add_argument("--warm", action="store_true", help="prefetch covers before measuring")
+    parser.add_argument(
+        "--no-cover-images", dest="cover_images", action="store_false", help="send cover URLs without local resizing"
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import asyncio
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+_CHAT_ID_MULTIPART = re.compile(rb'name="chat_id"\r\n\r\n(-?\d+)')
+_WORDS = (
+    "небо", "клинок", "тетрадь", "титан", "ветер", "звезда", "город", "демон", "школа", "дракон",
+    "shadow", "blade", "spirit", "ghost", "summer", "hunter", "academy", "moon", "garden", "island",
+)
+_EMOJI = "🔪👹🌸🐉🌙⭐🔥🧊🎭🏫👻🌊🍜🤖🎮📓💀🪚🧙🐱"
+
+
+def write_catalog(path: str, titles: int, photo_share: float, image_base_url: str, seed: int = 0) -> None:
+    # A catalog of made-up titles. Entries without a photo_url send the bot to AniList for a cover,
+    # so photo_share controls how much of the workload exercises the cover lookup path.
+    rng = random.Random(seed)
+    anime = []
+    for number in range(titles):
+        title = " ".join(rng.sample(_WORDS, rng.randint(1, 3))).capitalize() + f" {number}"
+        item = {"title": title, "description": " ".join(rng.choices(_WORDS, k=rng.randint(15, 40)))}
+        if rng.random() < photo_share:
+            item["photo_url"] = f"{image_base_url}/img/catalog-{number}.jpg"
+        anime.append(item)
+    payload = {
+        "aiky_messages": [f"Сообщение {number} 💖" for number in range(30)],
+        "emoji_game": [{"emoji": "".join(rng.sample(_EMOJI, 3)), "answer": item["title"]} for item in anime],
+        "anime": anime,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+
+
+# Stand-in for api.telegram.org and graphql.anilist.co on one local port, served from its own
+# thread and event loop so it does not compete with the bot under test.
+class FakeUpstreams:
+    def __init__(
+        self,
+        bot_latency: float = 0.0,
+        bot_error_rate: float = 0.0,
+        anilist_latency: float = 0.0,
+        anilist_error_rate: float = 0.0,
+        anilist_miss_rate: float = 0.0,
+    ) -> None:
+        self.bot_latency = bot_latency
+        self.bot_error_rate = bot_error_rate
+        self.anilist_latency = anilist_latency
+        self.anilist_error_rate = anilist_error_rate
+        self.anilist_miss_rate = anilist_miss_rate
+        self.calls: Counter[str] = Counter()
+        self.port = 0
+        self._ids = itertools.count(1)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: set[asyncio.Task] = set()
+        self._image: bytes | None = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fake-upstreams", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "FakeUpstreams":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        for task in self._connections:
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._serve, "127.0.0.1", 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+                status, content_type, payload = await self._route(method, path, headers, body)
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\nConnection: keep-alive\r\n\r\n".encode("latin-1")
+                    + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _route(self, method: str, path: str, headers: dict, body: bytes) -> tuple[int, str, bytes]:
+        if path.startswith("/bot"):
+            return await self._bot_api(path.rsplit("/", 1)[-1], headers, body)
+        if path.startswith("/graphql"):
+            return await self._anilist(body)
+        if path.startswith("/img/"):
+            self.calls["image"] += 1
+            return 200, "image/jpeg", self.image_bytes(path)
+        return 404, "text/plain", b"not found"
+
+    def image_bytes(self, path: str) -> bytes:
+        if self._image is None:
+            from PIL import Image
+
+            out = io.BytesIO()
+            Image.new("RGB", (1920, 1080), (200, 120, 160)).save(out, format="JPEG", quality=95)
+            self._image = out.getvalue()
+        return self._image
+
+    async def _bot_api(self, api_method: str, headers: dict, body: bytes) -> tuple[int, str, bytes]:
+        self.calls[api_method] += 1
+        if self.bot_latency:
+            await asyncio.sleep(self.bot_latency)
+        if self.bot_error_rate and random.random() < self.bot_error_rate:
+            self.calls["bot_errors"] += 1
+            error = {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                     "parameters": {"retry_after": 1}}
+            return 429, "application/json", json.dumps(error).encode()
+
+        if headers.get("content-type", "").startswith("multipart/"):
+            match = _CHAT_ID_MULTIPART.search(body)
+            params = {"chat_id": match.group(1).decode() if match else "0"}
+        else:
+            params = dict(parse_qsl(body.decode()))
+        result = self._bot_result(api_method, params)
+        return 200, "application/json", json.dumps({"ok": True, "result": result}).encode()
+
+    def _bot_result(self, api_method: str, params: dict) -> object:
+        if api_method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+                    "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": True}
+        if api_method not in ("sendMessage", "sendPhoto", "editMessageText"):
+            return True
+
+        message_id = next(self._ids)
+        chat_id = int(params.get("chat_id", "0").strip('"'))
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": {"id": 1, "is_bot": True, "first_name": "Bench"},
+        }
+        if api_method == "sendPhoto":
+            message["photo"] = [{"file_id": f"photo-{message_id}", "file_unique_id": f"u{message_id}",
+                                 "width": 1280, "height": 720}]
+            message["caption"] = params.get("caption", "")
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+    async def _anilist(self, body: bytes) -> tuple[int, str, bytes]:
+        self.calls["anilist"] += 1
+        if self.anilist_latency:
+            await asyncio.sleep(self.anilist_latency)
+        if self.anilist_error_rate and random.random() < self.anilist_error_rate:
+            self.calls["anilist_errors"] += 1
+            return 500, "application/json", b'{"errors": [{"message": "Internal Server Error"}]}'
+
+        variables = json.loads(body).get("variables") or {}
+
+        def media(search: str) -> dict | None:
+            if self.anilist_miss_rate and random.random() < self.anilist_miss_rate:
+                return None
+            digest = abs(hash(search)) % 10**8
+            return {"coverImage": {"extraLarge": f"{self.base_url}/img/{digest}.jpg", "large": None}}
+
+        if "search" in variables:
+            data = {"Media": media(variables["search"])}
+        else:
+            data = {f"m{name[1:]}": media(value) for name, value in variables.items()}
+        return 200, "application/json", json.dumps({"data": data}).encode()
@@ -0,0 +1,174 @@
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+from collections.abc import Awaitable, Callable
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+# Time of day (UTC) of the daily broadcast, as HH:MM.
+BROADCAST_AT = os.environ.get("ANITIME_BROADCAST_AT", "17:00")
+# Subscribers are read from SQLite this many at a time, ordered by chat_id.
+BROADCAST_CHUNK = int(os.environ.get("ANITIME_BROADCAST_CHUNK", "1000"))
+# Sends in flight at once; the rate limiter decides how fast they actually go out. A crash loses
+# at most one window, so it is kept to about a second of sends at the global rate.
+BROADCAST_WINDOW = int(os.environ.get("ANITIME_BROADCAST_WINDOW", "30"))
+# Sends that went out as text before the broadcast stops waiting for a file_id and goes
+# parallel anyway; a photo Telegram keeps rejecting should not make it serial to the end.
+BROADCAST_UPLOAD_ATTEMPTS = 3
+
+_LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (chat_id INTEGER PRIMARY KEY, subscribed_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    day TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    cursor INTEGER,
+    file_id TEXT,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# send(chat_id, file_id) delivers the day's pick to one chat and returns the file_id Telegram
+# assigned to the photo, or None when it went out as text.
+Send = Callable[[int, str | None], Awaitable[str | None]]
+
+
+# Subscribers and the progress of each day's broadcast. Recipients are handled in chat_id
+# order and the cursor is committed *before* a window is sent, so a broadcast resumed after a
+# crash continues behind the last claimed window: a chat may miss that day's message, but it
+# is never sent twice.
+class Broadcasts:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+        with conn:
+            conn.executescript(SCHEMA)
+
+    def subscribe(self, chat_id: int) -> bool:
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO subscribers (chat_id, subscribed_at) VALUES (?, strftime('%s', 'now'))",
+                (chat_id,),
+            )
+        return cursor.rowcount > 0
+
+    def unsubscribe(self, chat_ids: list[int]) -> int:
+        with self._conn:
+            cursor = self._conn.executemany("DELETE FROM subscribers WHERE chat_id = ?", [(chat_id,) for chat_id in chat_ids])
+        return cursor.rowcount
+
+    def _chunk(self, after: int | None, limit: int) -> list[int]:
+        rows = self._conn.execute(
+            "SELECT chat_id FROM subscribers WHERE chat_id > ? ORDER BY chat_id LIMIT ?",
+            (after if after is not None else -(2**63), limit),
+        ).fetchall()
+        return [chat_id for (chat_id,) in rows]
+
+    def day(self, day: datetime.date) -> tuple | None:
+        # (title, cursor, file_id, sent, failed, done)
+        return self._conn.execute(
+            "SELECT title, cursor, file_id, sent, failed, done FROM broadcasts WHERE day = ?", (day.isoformat(),)
+        ).fetchone()
+
+    def begin(self, day: datetime.date, title: str) -> tuple:
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO broadcasts (day, title) VALUES (?, ?)", (day.isoformat(), title))
+        return self.day(day)
+
+    def _update(self, day: datetime.date, **values: object) -> None:
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._conn:
+            self._conn.execute(f"UPDATE broadcasts SET {assignments} WHERE day = ?", (*values.values(), day.isoformat()))
+
+    def _count(self, day: datetime.date, sent: int, failed: int) -> None:
+        with self._conn:
+            self._conn.execute(
+                "UPDATE broadcasts SET sent = sent + ?, failed = failed + ? WHERE day = ?", (sent, failed, day.isoformat())
+            )
+
+    async def fan_out(self, day: datetime.date, send: Send) -> None:
+        _, cursor, file_id, _, _, done = self.day(day)
+        if done:
+            return
+
+        text_only = 0
+        while chunk := self._chunk(cursor, BROADCAST_CHUNK):
+            for start in range(0, len(chunk), BROADCAST_WINDOW):
+                window = chunk[start : start + BROADCAST_WINDOW]
+                cursor = window[-1]
+                self._update(day, cursor=cursor)
+
+                # Until a send comes back with a file_id, recipients are served one at a time, so
+                # the photo is uploaded once and every later send reuses its file_id. A send that
+                # fell back to text does not count as an upload.
+                while window and file_id is None and text_only < BROADCAST_UPLOAD_ATTEMPTS:
+                    chat_id, window = window[0], window[1:]
+                    results = await self._deliver(send, [chat_id], None)
+                    text_only += results[chat_id] is None
+                    file_id = _file_id(results)
+                    self._record(day, results, file_id)
+
+                if window:
+                    results = await self._deliver(send, window, file_id)
+                    file_id = file_id or _file_id(results)
+                    self._record(day, results, file_id)
+
+        self._update(day, done=1)
+
+    def _record(self, day: datetime.date, results: dict[int, str | Exception | None], file_id: str | None) -> None:
+        # A chat that blocked the bot or no longer exists is dropped from the subscribers.
+        gone = [
+            chat_id
+            for chat_id, result in results.items()
+            if isinstance(result, Forbidden) or (isinstance(result, BadRequest) and "chat not found" in result.message.lower())
+        ]
+        if gone:
+            self.unsubscribe(gone)
+        failed = sum(isinstance(result, Exception) for result in results.values())
+        self._count(day, len(results) - failed, failed)
+        if file_id is not None:
+            self._update(day, file_id=file_id)
+
+    async def _deliver(self, send: Send, chat_ids: list[int], file_id: str | None) -> dict[int, str | Exception | None]:
+        outcomes = await asyncio.gather(*(send(chat_id, file_id) for chat_id in chat_ids), return_exceptions=True)
+        results: dict[int, str | Exception | None] = {}
+        for chat_id, outcome in zip(chat_ids, outcomes):
+            if isinstance(outcome, BaseException) and not isinstance(outcome, TelegramError):
+                raise outcome
+            results[chat_id] = outcome
+        return results
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _file_id(results: dict[int, str | Exception | None]) -> str | None:
+    return next((result for result in results.values() if isinstance(result, str)), None)
+
+
+def next_run(now: datetime.datetime, at: str = BROADCAST_AT) -> datetime.datetime:
+    hour, minute = (int(part) for part in at.split(":"))
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return run if run > now else run + datetime.timedelta(days=1)
+
+
+async def run_daily(job: Callable[[datetime.date], Awaitable[None]], at: str = BROADCAST_AT) -> None:
+    # A broadcast whose time has already come today is started (or resumed) right away.
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if next_run(now, at).date() > now.date():
+        await _run_job(job, now.date())
+    while True:
+        run = next_run(datetime.datetime.now(datetime.timezone.utc), at)
+        await asyncio.sleep((run - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+        await _run_job(job, run.date())
+
+
+async def _run_job(job: Callable[[datetime.date], Awaitable[None]], day: datetime.date) -> None:
+    try:
+        await job(day)
+    except Exception:
+        _LOGGER.exception("Daily broadcast for %s failed; it resumes on the next start", day)
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from storage import open_db
+
+COVER_CACHE_MAX_SIZE = int(os.environ.get("COVER_CACHE_MAX_SIZE", "5000"))
+COVER_CACHE_HIT_TTL = float(os.environ.get("COVER_CACHE_HIT_TTL", str(30 * 24 * 3600)))
+COVER_CACHE_MISS_TTL = float(os.environ.get("COVER_CACHE_MISS_TTL", str(6 * 3600)))
+# The SQLite table is shared by every shard process, so it is bounded on its own, independently of
+# each process's in-memory LRU; it is pruned every COVER_CACHE_PRUNE_EVERY writes.
+COVER_CACHE_TABLE_MAX_SIZE = int(os.environ.get("COVER_CACHE_TABLE_MAX_SIZE", "50000"))
+COVER_CACHE_PRUNE_EVERY = 100
+
+
+class CoverCache:
+    def __init__(
+        self,
+        conn: sqlite3.Connection | None = None,
+        max_size: int = COVER_CACHE_MAX_SIZE,
+        hit_ttl: float = COVER_CACHE_HIT_TTL,
+        miss_ttl: float = COVER_CACHE_MISS_TTL,
+        table_max_size: int = COVER_CACHE_TABLE_MAX_SIZE,
+    ) -> None:
+        self.max_size = max_size
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.table_max_size = table_max_size
+        self._conn = conn
+        self._writes = 0
+        # title -> (url or None for a cached miss, expires_at)
+        self._entries: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+        if conn is not None:
+            self._load()
+
+    def _load(self) -> None:
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cover_cache (title TEXT PRIMARY KEY, url TEXT, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cover_cache_expires_at ON cover_cache (expires_at)")
+            self._conn.execute("DELETE FROM cover_cache WHERE expires_at <= ?", (time.time(),))
+        rows = self._conn.execute(
+            "SELECT title, url, expires_at FROM cover_cache ORDER BY expires_at DESC LIMIT ?", (self.max_size,)
+        ).fetchall()
+        for title, url, expires_at in reversed(rows):
+            self._entries[title] = (url, expires_at)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, title: str) -> bool:
+        return self.get(title)[0]
+
+    def get(self, title: str) -> tuple[bool, str | None]:
+        entry = self._entries.get(title)
+        if entry is None and self._conn is not None:
+            # Other shard processes write to the same table; pick up their answers on a local miss.
+            entry = self._conn.execute(
+                "SELECT url, expires_at FROM cover_cache WHERE title = ?", (title,)
+            ).fetchone()
+            if entry is not None:
+                self._entries[title] = entry
+        if entry is None:
+            return False, None
+
+        url, expires_at = entry
+        if expires_at <= time.time():
+            self._expire(title)
+            return False, None
+
+        self._entries.move_to_end(title)
+        self._evict()
+        return True, url
+
+    def set(self, title: str, url: str | None) -> None:
+        expires_at = time.time() + (self.hit_ttl if url else self.miss_ttl)
+        self._entries[title] = (url or None, expires_at)
+        self._entries.move_to_end(title)
+        if self._conn is not None:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cover_cache (title, url, expires_at) VALUES (?, ?, ?)",
+                    (title, url or None, expires_at),
+                )
+            self._writes += 1
+            if self._writes % COVER_CACHE_PRUNE_EVERY == 0:
+                self._prune()
+        self._evict()
+
+    def _evict(self) -> None:
+        # Least recently used entries leave this process's memory only; the row stays in SQLite for
+        # other shards (and for a later read-through here) until it expires or the table is pruned.
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _expire(self, title: str) -> None:
+        self._entries.pop(title, None)
+        if self._conn is not None:
+            with self._conn:
+                # Another shard may already have stored a fresh answer under this title.
+                self._conn.execute("DELETE FROM cover_cache WHERE title = ? AND expires_at <= ?", (title, time.time()))
+
+    def _prune(self) -> None:
+        with self._conn:
+            self._conn.execute("DELETE FROM cover_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.execute(
+                "DELETE FROM cover_cache WHERE title IN "
+                "(SELECT title FROM cover_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.table_max_size,),
+            )
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def open_cover_cache() -> CoverCache:
+    return CoverCache(open_db())
+
+
+class FileIdCache:
+    def __init__(self, conn: sqlite3.Connection | None = None) -> None:
+        self._conn = conn
+        self._file_ids: dict[str, str] = {}
+        if conn is not None:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS photo_file_ids (source TEXT PRIMARY KEY, file_id TEXT NOT NULL)")
+            self._file_ids.update(conn.execute("SELECT source, file_id FROM photo_file_ids"))
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    def get(self, source: str) -> str | None:
+        file_id = self._file_ids.get(source)
+        if file_id is None and self._conn is not None:
+            row = self._conn.execute("SELECT file_id FROM photo_file_ids WHERE source = ?", (source,)).fetchone()
+            if row is not None:
+                file_id = self._file_ids[source] = row[0]
+        return file_id
+
+    def set(self, source: str, file_id: str) -> None:
+        if self._file_ids.get(source) == file_id:
+            return
+        self._file_ids[source] = file_id
+        if self._conn is not None:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO photo_file_ids (source, file_id) VALUES (?, ?)", (source, file_id)
+                )
+
+    def discard(self, source: str) -> None:
+        if self._file_ids.pop(source, None) is not None and self._conn is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM photo_file_ids WHERE source = ?", (source,))
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def open_file_id_cache() -> FileIdCache:
+    return FileIdCache(open_db())
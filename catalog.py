@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from recommend import Recommender
+from search import TitleIndex
+
+CATALOG_PATH = os.environ.get("ANITIME_CATALOG", str(Path(__file__).with_name("catalog.json")))
+CATALOG_RELOAD_INTERVAL = float(os.environ.get("ANITIME_CATALOG_RELOAD_INTERVAL", "5"))
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class GameIndex:
+    def __init__(self, titles: list[str], emoji_by_answer: dict[str, list[dict]]) -> None:
+        self.distractors = tuple(titles)
+        title_set = set(titles)
+        self.answers = tuple(answer for answer in emoji_by_answer if answer in title_set)
+        self.emoji_by_answer = {answer: tuple(emoji_by_answer[answer]) for answer in self.answers}
+
+    def __bool__(self) -> bool:
+        return bool(self.answers) and len(self.distractors) >= 4
+
+    def pick_answer(self, used: set[str]) -> str:
+        # Rejection sampling stays O(1) while most answers are unused; once half of them are
+        # used the remaining ones are filtered out directly.
+        if len(used) * 2 < len(self.answers):
+            while True:
+                answer = random.choice(self.answers)
+                if answer not in used:
+                    return answer
+
+        fresh = [answer for answer in self.answers if answer not in used]
+        return random.choice(fresh or self.answers)
+
+    def pick_item(self, answer: str) -> dict:
+        return random.choice(self.emoji_by_answer[answer])
+
+    def pick_options(self, answer: str) -> list[str]:
+        picked = [self.distractors[i] for i in random.sample(range(len(self.distractors)), 4)]
+        options = [title for title in picked if title != answer][:3] + [answer]
+        random.shuffle(options)
+        return options
+
+
+class Catalog:
+    def __init__(self, anime: list[dict], emoji_game: list[dict], aiky_messages: list[str]) -> None:
+        self.anime = anime
+        self.emoji_game = emoji_game
+        self.aiky_messages = aiky_messages
+
+        self.by_title: dict[str, dict] = {}
+        for item in anime:
+            title = item.get("title")
+            if title:
+                self.by_title.setdefault(title, item)
+
+        self.emoji_by_answer: dict[str, list[dict]] = {}
+        for item in emoji_game:
+            answer = item.get("answer")
+            if answer:
+                self.emoji_by_answer.setdefault(answer, []).append(item)
+
+        self.game = GameIndex(list(self.by_title), self.emoji_by_answer)
+        self.search = TitleIndex(anime)
+        self.recommend = Recommender(anime)
+
+
+def _checked(payload: dict, key: str, fields: tuple[str, ...]) -> list[dict]:
+    # A field of the wrong type rejects the whole file, so a bad edit keeps the previous catalog
+    # instead of failing later while the new one is indexed.
+    items = payload.get(key, [])
+    if not isinstance(items, list):
+        raise ValueError(f"{key} must be a list")
+    checked = []
+    for number, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        for field in fields:
+            value = item.get(field)
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{key}[{number}].{field} must be a string")
+        checked.append(item)
+    return checked
+
+
+def load_catalog(path: str = CATALOG_PATH) -> Catalog:
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    if not isinstance(payload, dict):
+        raise ValueError("catalog must be a JSON object")
+    aiky_messages = payload.get("aiky_messages", [])
+    if not isinstance(aiky_messages, list):
+        raise ValueError("aiky_messages must be a list")
+    return Catalog(
+        anime=_checked(payload, "anime", ("title", "description", "photo_url")),
+        emoji_game=_checked(payload, "emoji_game", ("emoji", "answer")),
+        aiky_messages=[text for text in aiky_messages if isinstance(text, str)],
+    )
+
+
+class CatalogStore:
+    def __init__(self, path: str = CATALOG_PATH) -> None:
+        self.path = path
+        self._stamp = self._read_stamp()
+        self.current = load_catalog(path)
+
+    def _read_stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def reload_if_changed(self) -> bool:
+        stamp = self._read_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+
+        try:
+            catalog = await asyncio.to_thread(load_catalog, self.path)
+        except (OSError, ValueError):
+            # A half-written or broken file keeps the previous catalog and is retried on the next poll.
+            return False
+        except Exception:
+            # Anything load_catalog does not catch must not end the watch loop either.
+            _LOGGER.exception("Catalog reload failed; keeping the previous catalog")
+            return False
+
+        # Handlers read self.current once per update, so swapping the reference never
+        # changes the catalog under an update that is already being handled.
+        self._stamp = stamp
+        self.current = catalog
+        return True
+
+    async def watch(
+        self,
+        on_reload: Callable[[Catalog], Awaitable[object]] | None = None,
+        interval: float = CATALOG_RELOAD_INTERVAL,
+    ) -> None:
+        # on_reload runs as its own task, so a slow prefetch never delays noticing the next change;
+        # a newer catalog cancels the run for the one it replaces.
+        running: asyncio.Task | None = None
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                if not await self.reload_if_changed() or on_reload is None:
+                    continue
+                if running is not None:
+                    running.cancel()
+                running = asyncio.create_task(_after_reload(on_reload, self.current), name="catalog_on_reload")
+        finally:
+            if running is not None:
+                running.cancel()
+
+
+async def _after_reload(on_reload: Callable[[Catalog], Awaitable[object]], catalog: Catalog) -> None:
+    try:
+        await on_reload(catalog)
+    except Exception:
+        _LOGGER.exception("Catalog reload hook failed; the new catalog is in use regardless")
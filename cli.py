@@ -0,0 +1,47 @@
+import argparse
+from dataclasses import replace
+
+from dotenv import load_dotenv
+
+
+def main(argv: list[str] | None = None) -> None:
+    load_dotenv()
+    # Imported after .env is loaded so module-level settings read from the environment see it.
+    from Anitine_bot import create_app
+    from config import Config
+
+    parser = argparse.ArgumentParser(prog="anitime", description="Anitime Telegram bot")
+    parser.add_argument("--webhook-url", help="serve a webhook at this public URL instead of long polling")
+    parser.add_argument("--listen", help="webhook listen address")
+    parser.add_argument("--port", type=int, help="webhook listen port")
+    parser.add_argument("--workers", type=int, help="shard chats across this many worker processes")
+    args = parser.parse_args(argv)
+
+    config = Config.from_env()
+    overrides = {
+        "webhook_url": args.webhook_url,
+        "webhook_listen": args.listen,
+        "webhook_port": args.port,
+        "workers": args.workers,
+    }
+    config = replace(config, **{name: value for name, value in overrides.items() if value is not None})
+    if not config.token:
+        parser.error("TELEGRAM_BOT_TOKEN is not set (environment or .env)")
+
+    if config.workers > 1:
+        from shards import run_sharded
+
+        run_sharded(config, create_app)
+        return
+
+    if not config.webhook_url:
+        create_app(config).run_polling()
+        return
+
+    from webhook import run_webhook, webhook_secret
+
+    run_webhook(create_app(config), config, webhook_secret(config))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+from dataclasses import dataclass
+
+from anilist import ANILIST_ENDPOINT
+from catalog import CATALOG_PATH
+from images import IMAGE_DIR
+from metrics import METRICS_LISTEN, METRICS_PORT
+from persistence import PERSISTENCE_INTERVAL
+from storage import DB_PATH
+from updates import CONCURRENT_UPDATES
+
+
+@dataclass(frozen=True)
+class Config:
+    token: str = ""
+    db_path: str = DB_PATH
+    catalog_path: str = CATALOG_PATH
+    anilist_endpoint: str = ANILIST_ENDPOINT
+    image_dir: str = IMAGE_DIR
+    concurrent_updates: int = CONCURRENT_UPDATES
+    persistence: bool = True
+    persistence_interval: float = PERSISTENCE_INTERVAL
+    webhook_url: str = ""
+    webhook_listen: str = "127.0.0.1"
+    webhook_port: int = 8080
+    webhook_path: str = "telegram"
+    webhook_secret: str = ""
+    webhook_max_connections: int = 40
+    workers: int = 1
+    shard: int = 0
+    metrics_listen: str = METRICS_LISTEN
+    metrics_port: int = METRICS_PORT
+
+    @classmethod
+    def from_env(cls) -> "Config":
+        env = os.environ
+        return cls(
+            token=env.get("TELEGRAM_BOT_TOKEN", ""),
+            persistence=env.get("ANITIME_PERSISTENCE", "1") != "0",
+            webhook_url=env.get("ANITIME_WEBHOOK_URL", ""),
+            webhook_listen=env.get("ANITIME_WEBHOOK_LISTEN", cls.webhook_listen),
+            webhook_port=int(env.get("ANITIME_WEBHOOK_PORT", cls.webhook_port)),
+            webhook_path=env.get("ANITIME_WEBHOOK_PATH", cls.webhook_path),
+            webhook_secret=env.get("ANITIME_WEBHOOK_SECRET", ""),
+            webhook_max_connections=int(env.get("ANITIME_WEBHOOK_MAX_CONNECTIONS", cls.webhook_max_connections)),
+            workers=int(env.get("ANITIME_WORKERS", cls.workers)),
+        )
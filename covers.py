@@ -0,0 +1,95 @@
+import asyncio
+import os
+
+from anilist import ANILIST_BATCH_SIZE, AniListClient, AniListError
+from cache import CoverCache
+from metrics import COVER_LOOKUPS
+
+COVER_PREFETCH_CONCURRENCY = int(os.environ.get("COVER_PREFETCH_CONCURRENCY", "2"))
+
+
+class CoverResolver:
+    def __init__(self, client: AniListClient, cache: CoverCache) -> None:
+        self.client = client
+        self.cache = cache
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def resolve(self, title: str) -> str | None:
+        found, cached = self.cache.get(title)
+        if found:
+            COVER_LOOKUPS.inc("hit")
+            return cached
+
+        future = self._inflight.get(title)
+        if future is None:
+            COVER_LOOKUPS.inc("miss")
+            future = asyncio.ensure_future(self._lookup(title))
+            self._track(title, future)
+        else:
+            COVER_LOOKUPS.inc("coalesced")
+
+        # Shielded so a caller that gives up does not cancel the lookup for everyone else waiting on it.
+        return await asyncio.shield(future)
+
+    def _track(self, title: str, future: asyncio.Future) -> None:
+        self._inflight[title] = future
+        future.add_done_callback(lambda _: self._inflight.pop(title, None))
+
+    async def _lookup(self, title: str) -> str | None:
+        try:
+            url = await self.client.fetch_cover_url(title)
+        except AniListError:
+            return None
+        self.cache.set(title, url)
+        return url
+
+    async def prefetch(
+        self,
+        titles: list[str],
+        batch_size: int = ANILIST_BATCH_SIZE,
+        concurrency: int = COVER_PREFETCH_CONCURRENCY,
+    ) -> int:
+        missing = list(dict.fromkeys(t for t in titles if t and t not in self.cache and t not in self._inflight))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_batch(batch: list[str]) -> int:
+            async with semaphore:
+                # Titles are claimed only once the batch is about to be sent: a user asking for a
+                # title in a queued batch does a lookup of their own instead of waiting behind the
+                # whole prefetch, and the batch then leaves that title out.
+                loop = asyncio.get_running_loop()
+                futures = {
+                    title: loop.create_future()
+                    for title in batch
+                    if title not in self._inflight and not self.cache.get(title)[0]
+                }
+                for title, future in futures.items():
+                    self._track(title, future)
+                if not futures:
+                    return 0
+
+                try:
+                    urls = await self.client.fetch_cover_urls(list(futures))
+                except AniListError:
+                    for future in futures.values():
+                        future.set_result(None)
+                    return 0
+                except BaseException:
+                    for future in futures.values():
+                        future.cancel()
+                    raise
+
+            for title, future in futures.items():
+                self.cache.set(title, urls.get(title))
+                future.set_result(urls.get(title))
+            return len(futures)
+
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        resolved = await asyncio.gather(*(run_batch(batch) for batch in batches))
+        return sum(resolved)
+
+    async def aclose(self) -> None:
+        for future in list(self._inflight.values()):
+            future.cancel()
+        await self.client.aclose()
+        self.cache.close()
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+from pathlib import Path
+
+import httpx
+
+# An empty directory turns the pipeline off: covers are then sent by file_id or remote URL only.
+IMAGE_DIR = os.environ.get("ANITIME_IMAGE_DIR", "cover_images")
+IMAGE_MAX_SIDE = int(os.environ.get("ANITIME_IMAGE_MAX_SIDE", "1280"))
+IMAGE_JPEG_QUALITY = int(os.environ.get("ANITIME_IMAGE_JPEG_QUALITY", "85"))
+IMAGE_MAX_DOWNLOAD = int(os.environ.get("ANITIME_IMAGE_MAX_DOWNLOAD", str(15 * 1024 * 1024)))
+IMAGE_CONCURRENCY = int(os.environ.get("ANITIME_IMAGE_CONCURRENCY", "4"))
+IMAGE_TIMEOUT = float(os.environ.get("ANITIME_IMAGE_TIMEOUT", "20"))
+
+
+def reencode(data: bytes, max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_JPEG_QUALITY) -> bytes:
+    # Imported here so bots that never touch the pipeline do not pay for loading Pillow.
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # draft() lets the JPEG decoder downscale while decoding, which is much cheaper than
+            # decoding the full 1920px image and resizing afterwards.
+            image.draft("RGB", (max_side, max_side))
+            image = image.convert("RGB")
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+    except Image.DecompressionBombError as exc:
+        raise ValueError(str(exc)) from exc
+    return out.getvalue()
+
+
+# Covers are downloaded once, shrunk to a Telegram-sized JPEG and stored under the SHA-256 of
+# the result, so identical images shared by several titles are kept once. The source URL ->
+# digest map lives in SQLite next to the other caches.
+class CoverImages:
+    def __init__(self, conn: sqlite3.Connection, directory: str = IMAGE_DIR, concurrency: int = IMAGE_CONCURRENCY) -> None:
+        self._conn = conn
+        self.enabled = bool(directory)
+        self.directory = Path(directory)
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cover_images (source TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+        self._digests: dict[str, str] = dict(conn.execute("SELECT source, digest FROM cover_images"))
+        self._failed: set[str] = set()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(IMAGE_TIMEOUT), follow_redirects=True)
+        return self._client
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / f"{digest}.jpg"
+
+    def _digest(self, source: str) -> str | None:
+        digest = self._digests.get(source)
+        if digest is None:
+            # Another shard process may have stored this cover since we loaded the map.
+            row = self._conn.execute("SELECT digest FROM cover_images WHERE source = ?", (source,)).fetchone()
+            if row is not None:
+                digest = self._digests[source] = row[0]
+        return digest
+
+    def get(self, source: str) -> bytes | None:
+        if not self.enabled:
+            return None
+        digest = self._digest(source)
+        if digest is None:
+            return None
+        try:
+            return self._path(digest).read_bytes()
+        except OSError:
+            self._digests.pop(source, None)
+            return None
+
+    def schedule(self, source: str) -> None:
+        if not self.enabled or source in self._failed or source in self._inflight or self._digest(source) is not None:
+            return
+        task = asyncio.create_task(self._process(source))
+        self._inflight[source] = task
+        task.add_done_callback(lambda _: self._inflight.pop(source, None))
+
+    async def prefetch(self, sources: list[str]) -> None:
+        for source in sources:
+            self.schedule(source)
+        await asyncio.gather(*list(self._inflight.values()), return_exceptions=True)
+
+    async def _process(self, source: str) -> None:
+        async with self._semaphore:
+            try:
+                data = await self._download(source)
+                image = await asyncio.to_thread(reencode, data)
+            except (httpx.HTTPError, OSError, ValueError):
+                # Not retried until restart; the bot keeps sending the remote URL for this cover.
+                self._failed.add(source)
+                return
+
+        digest = hashlib.sha256(image).hexdigest()
+        await asyncio.to_thread(self._store, source, digest, image)
+        self._digests[source] = digest
+
+    async def _download(self, source: str) -> bytes:
+        chunks = []
+        size = 0
+        async with self.client.stream("GET", source) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.aiter_bytes():
+                size += len(chunk)
+                if size > IMAGE_MAX_DOWNLOAD:
+                    raise ValueError(f"{source} is larger than {IMAGE_MAX_DOWNLOAD} bytes")
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _store(self, source: str, digest: str, image: bytes) -> None:
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(image)
+            os.replace(tmp, path)
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO cover_images (source, digest) VALUES (?, ?)", (source, digest))
+
+    async def aclose(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await asyncio.gather(*list(self._inflight.values()), return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._conn.close()
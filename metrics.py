@@ -0,0 +1,163 @@
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_LISTEN = os.environ.get("ANITIME_METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("ANITIME_METRICS_PORT", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+# Updates happen on the event loop and rendering on the HTTP thread; each metric guards its
+# samples with a lock, which costs far less than the handlers being measured.
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.label_names, labels)} {value}" for labels, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels((*self.label_names, 'le'), (*labels, le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self._read: Callable[[], float] = lambda: 0.0
+
+    def set_function(self, read: Callable[[], float]) -> None:
+        self._read = read
+
+    def render(self) -> list[str]:
+        try:
+            value = self._read()
+        except Exception:
+            value = float("nan")
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+HANDLER_SECONDS = Histogram("anitime_handler_seconds", "Handler latency by command.", ("handler",))
+HANDLER_ERRORS = Counter("anitime_handler_errors_total", "Handler exceptions by command.", ("handler", "error"))
+COVER_LOOKUPS = Counter("anitime_cover_lookups_total", "Cover cache lookups by result.", ("result",))
+ANILIST_SECONDS = Histogram("anitime_anilist_seconds", "AniList GraphQL request latency.")
+ANILIST_ERRORS = Counter("anitime_anilist_errors_total", "Failed AniList requests by error.", ("error",))
+SEND_SECONDS = Histogram("anitime_send_seconds", "Bot API call latency by method.", ("method",))
+SEND_FAILURES = Counter("anitime_send_failures_total", "Failed Bot API calls by method and error.", ("method", "error"))
+ACTIVE_GAMES = Gauge("anitime_active_games", "Chats with an emoji game in progress.")
+
+REGISTRY = [
+    HANDLER_SECONDS,
+    HANDLER_ERRORS,
+    COVER_LOOKUPS,
+    ANILIST_SECONDS,
+    ANILIST_ERRORS,
+    SEND_SECONDS,
+    SEND_FAILURES,
+    ACTIVE_GAMES,
+]
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def instrument(name: str, handler: Callable[..., Awaitable[None]]) -> Callable[..., Awaitable[None]]:
+    @functools.wraps(handler)
+    async def timed(*args, **kwargs) -> None:
+        started = time.perf_counter()
+        try:
+            await handler(*args, **kwargs)
+        except Exception as exc:
+            HANDLER_ERRORS.inc(name, type(exc).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+    return timed
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_metrics_server(listen: str = METRICS_LISTEN, port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((listen, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
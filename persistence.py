@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import sqlite3
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from storage import DB_PATH, open_db
+
+PERSISTENCE_INTERVAL = float(os.environ.get("ANITIME_PERSISTENCE_INTERVAL", "30"))
+
+
+def _encode(value: object) -> object:
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Cannot persist {type(value).__name__}")
+
+
+# Stores chat_data only, as one compact JSON row per chat. The Application hands over changed
+# chats every update_interval seconds; they are buffered and written in a single transaction.
+class SQLitePersistence(BasePersistence):
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        update_interval: float = PERSISTENCE_INTERVAL,
+        shard: int = 0,
+        shards: int = 1,
+    ) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._conn = conn
+        self.shard = shard
+        self.shards = shards
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        self._pending: dict[int, str | None] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        rows = await asyncio.to_thread(lambda: self._conn.execute("SELECT chat_id, data FROM chat_data").fetchall())
+        # A shard worker only loads the chats routed to it (see shards.shard_of).
+        return {chat_id: json.loads(data) for chat_id, data in rows if chat_id % self.shards == self.shard}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._pending[chat_id] = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_encode)
+        self._schedule_flush()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._pending[chat_id] = None
+        self._schedule_flush()
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    def _schedule_flush(self) -> None:
+        # All chats of one persistence run are buffered before this task gets to run.
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        await asyncio.sleep(0)
+        pending, self._pending = self._pending, {}
+        if pending:
+            await asyncio.to_thread(self._write, pending)
+
+    def _write(self, pending: dict[int, str | None]) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chat_data (chat_id, data) VALUES (?, ?)",
+                [(chat_id, data) for chat_id, data in pending.items() if data is not None],
+            )
+            self._conn.executemany(
+                "DELETE FROM chat_data WHERE chat_id = ?",
+                [(chat_id,) for chat_id, data in pending.items() if data is None],
+            )
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write_pending()
+        self._conn.close()
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data: object) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object) -> None:
+        pass
+
+
+def open_persistence(
+    path: str = DB_PATH, update_interval: float = PERSISTENCE_INTERVAL, shard: int = 0, shards: int = 1
+) -> SQLitePersistence:
+    return SQLitePersistence(open_db(path), update_interval=update_interval, shard=shard, shards=shards)
@@ -0,0 +1,261 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections.abc import Callable, Coroutine
+from datetime import timedelta
+from typing import Any
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import SEND_FAILURES, SEND_SECONDS
+
+GLOBAL_RATE = float(os.environ.get("ANITIME_SEND_GLOBAL_RATE", "30"))
+# Share of the global bucket that bulk sends leave untouched, so interactive replies from any
+# worker still find tokens while a broadcast is running.
+BULK_RESERVE = float(os.environ.get("ANITIME_SEND_BULK_RESERVE", "0.2"))
+PRIVATE_CHAT_RATE = float(os.environ.get("ANITIME_SEND_CHAT_RATE", "1"))
+PRIVATE_CHAT_BURST = float(os.environ.get("ANITIME_SEND_CHAT_BURST", "3"))
+GROUP_CHAT_RATE = float(os.environ.get("ANITIME_SEND_GROUP_RATE", str(20 / 60)))
+GROUP_CHAT_BURST = float(os.environ.get("ANITIME_SEND_GROUP_BURST", "5"))
+SEND_MAX_RETRIES = int(os.environ.get("ANITIME_SEND_MAX_RETRIES", "3"))
+
+# rate_limit_args values accepted by bot methods, e.g. reply_text(..., rate_limit_args=PRIORITY_BULK).
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+_COALESCED_ENDPOINTS = frozenset({"editMessageReplyMarkup", "editMessageText", "editMessageCaption"})
+_MAX_IDLE_BUCKETS = 10_000
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+# The bot-wide limits: the global token bucket and the flood-control pause. The state lives in
+# shared memory, so shard workers forked from one parent draw on a single budget and a
+# RetryAfter seen by one of them holds back the others too. time.monotonic() is system-wide,
+# so timestamps compare across processes.
+class SendBudget:
+    def __init__(self, rate: float = GLOBAL_RATE, bulk_reserve: float = BULK_RESERVE) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.bulk_reserve = bulk_reserve * self.capacity
+        # tokens, last refill, paused until
+        self._state = multiprocessing.Array("d", [self.capacity, time.monotonic(), 0.0])
+
+    def reserve(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        # Takes a token and returns 0, or returns how long to wait before asking again.
+        needed = 1.0 if priority <= PRIORITY_INTERACTIVE else 1.0 + self.bulk_reserve
+        with self._state.get_lock():
+            state = self._state
+            now = time.monotonic()
+            if state[2] > now:
+                return state[2] - now
+            tokens = min(self.capacity, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if tokens >= needed:
+                state[0] = tokens - 1
+                return 0.0
+            state[0] = tokens
+            return (needed - tokens) / self.rate
+
+    def pause(self, seconds: float) -> None:
+        with self._state.get_lock():
+            self._state[2] = max(self._state[2], time.monotonic() + seconds)
+
+
+def retry_after_seconds(exc: RetryAfter) -> float:
+    retry_after = getattr(exc, "_retry_after", None)
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after or 1)
+
+
+# Every Bot API call passes through process_request. Calls aimed at a chat wait for that chat's
+# token bucket, then for the global budget; the global budget is handed out strictly by
+# priority, so interactive replies overtake bulk sends that are queued at the same time. Pass
+# one SendBudget to every scheduler that sends as the same bot.
+class SendScheduler(BaseRateLimiter[int]):
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = PRIVATE_CHAT_RATE,
+        chat_burst: float = PRIVATE_CHAT_BURST,
+        group_rate: float = GROUP_CHAT_RATE,
+        group_burst: float = GROUP_CHAT_BURST,
+        max_retries: int = SEND_MAX_RETRIES,
+        budget: SendBudget | None = None,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._budget = budget if budget is not None else SendBudget(global_rate)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._chat_queues: dict[int | str, tuple[asyncio.Lock, int]] = {}
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._pending_edits: dict[tuple, asyncio.Future] = {}
+
+    async def initialize(self) -> None:
+        # Application and Updater both initialize the bot, and ExtBot passes each call on here.
+        if self._dispatcher is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="send_scheduler")
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for _, _, future in self._waiters:
+            future.cancel()
+        self._waiters.clear()
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_IDLE_BUCKETS:
+                for key in [key for key, old in self._chats.items() if old.full and key not in self._chat_queues]:
+                    del self._chats[key]
+            # Negative ids and @usernames are groups and channels, which Telegram limits far harder.
+            group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(self.group_rate, self.group_burst) if group else TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _dispatch(self) -> None:
+        while True:
+            # Cancelled senders are dropped first, so no token is spent on them.
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._budget.reserve(self._waiters[0][0])
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    async def _acquire_global(self, priority: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._wakeup.set()
+        await future
+
+    async def _acquire_chat(self, chat_id: int | str) -> None:
+        # Senders to one chat queue on a FIFO lock so messages keep their order.
+        lock, users = self._chat_queues.get(chat_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._chat_queues[chat_id] = (lock, users + 1)
+        try:
+            async with lock:
+                bucket = self._chat_bucket(chat_id)
+                while (delay := bucket.delay()) > 0:
+                    await asyncio.sleep(delay)
+                bucket.take()
+        finally:
+            lock, users = self._chat_queues[chat_id]
+            if users <= 1:
+                del self._chat_queues[chat_id]
+            else:
+                self._chat_queues[chat_id] = (lock, users - 1)
+
+    async def _send(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict | list[dict]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        chat_id: int | str | None,
+        priority: int,
+    ) -> bool | dict | list[dict]:
+        retries = 0
+        while True:
+            if chat_id is not None:
+                await self._acquire_chat(chat_id)
+            await self._acquire_global(priority)
+            started = time.perf_counter()
+            try:
+                result = await callback(*args, **kwargs)
+            except Exception as exc:
+                SEND_FAILURES.inc(endpoint, type(exc).__name__)
+                if not isinstance(exc, RetryAfter) or retries >= self.max_retries:
+                    raise
+                retries += 1
+                pause = retry_after_seconds(exc) + 0.1
+                _LOGGER.info("Flood control hit, pausing sends for %.1fs", pause)
+                # Telegram does not say which limit was hit, so all sends are held back.
+                self._budget.pause(pause)
+                await asyncio.sleep(pause)
+            else:
+                SEND_SECONDS.observe(time.perf_counter() - started, endpoint)
+                return result
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict | list[dict]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> bool | dict | list[dict]:
+        priority = PRIORITY_INTERACTIVE if rate_limit_args is None else rate_limit_args
+        chat_id = data.get("chat_id")
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+
+        if endpoint not in _COALESCED_ENDPOINTS or chat_id is None:
+            return await self._send(callback, args, kwargs, endpoint, chat_id, priority)
+
+        # An identical edit of the same message that is still queued is sent once for both callers.
+        key = (endpoint, chat_id, json.dumps(data, sort_keys=True, default=str))
+        pending = self._pending_edits.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.ensure_future(self._send(callback, args, kwargs, endpoint, chat_id, priority))
+        self._pending_edits[key] = future
+        future.add_done_callback(lambda _: self._pending_edits.pop(key, None))
+        return await asyncio.shield(future)
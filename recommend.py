@@ -0,0 +1,126 @@
+import os
+import zlib
+from array import array
+
+import numpy as np
+
+from search import trigrams
+
+RECOMMEND_TOP_K = int(os.environ.get("ANITIME_RECOMMEND_TOP_K", "5"))
+# Trigram features are hashed into HASH_DIM signed buckets, then reduced to EMBEDDING_DIM with
+# an SVD; the reduced width is what keeps a matrix-vector product over the catalog cheap.
+HASH_DIM = 512
+EMBEDDING_DIM = 64
+TITLE_WEIGHT = 2.0
+# Rows of the hashed matrix materialized at once; the full items x HASH_DIM matrix never is.
+EMBED_BLOCK_ROWS = 2048
+
+
+def _bucket(gram: str) -> tuple[int, float]:
+    # crc32 rather than hash(), so every process (and every shard) builds the same matrix.
+    code = zlib.crc32(gram.encode())
+    return code % HASH_DIM, 1.0 if code & 0x80000000 else -1.0
+
+
+class Recommender:
+    def __init__(self, anime: list[dict]) -> None:
+        self.items = tuple(item for item in anime if item.get("title"))
+        self.index = {item["title"]: doc for doc, item in enumerate(self.items)}
+
+        # Typed arrays instead of lists of Python numbers: the feature triples are the bulk of the
+        # memory while the matrix is built.
+        vocab: dict[str, int] = {}
+        rows = array("i")
+        columns = array("i")
+        weights = array("f")
+        for doc, item in enumerate(self.items):
+            grams = dict.fromkeys(trigrams(item.get("description", "")), 1.0)
+            grams.update(dict.fromkeys(trigrams(item["title"]), TITLE_WEIGHT))
+            rows.extend([doc] * len(grams))
+            columns.extend(vocab.setdefault(gram, len(vocab)) for gram in grams)
+            weights.extend(grams.values())
+        self.embeddings = self._embed(
+            vocab,
+            np.frombuffer(rows, dtype=np.int32),
+            np.frombuffer(columns, dtype=np.int32),
+            np.frombuffer(weights, dtype=np.float32),
+        )
+
+    def _embed(self, vocab: dict[str, int], rows: np.ndarray, columns: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        if not vocab:
+            return np.zeros((len(self.items), EMBEDDING_DIM), dtype=np.float32)
+
+        # TF-IDF with binary term frequency (the title's trigrams weigh double), summed into
+        # signed hash buckets.
+        buckets, signs = (np.array(values) for values in zip(*map(_bucket, vocab)))
+        idf = np.log((1 + len(self.items)) / (1 + np.bincount(columns, minlength=len(vocab))))
+        # Per-feature factors are combined before they are spread over the entries, so only
+        # float32/int32 arrays of the entries' length are ever allocated.
+        values = weights * (idf * signs).astype(np.float32)[columns]
+        cells = buckets.astype(np.int32)[columns]
+        # rows is sorted (entries were appended document by document), so each block of
+        # documents is one contiguous slice of the entries.
+        bounds = np.searchsorted(rows, np.arange(0, len(self.items) + EMBED_BLOCK_ROWS, EMBED_BLOCK_ROWS))
+
+        def blocks():
+            for start, (low, high) in zip(range(0, len(self.items), EMBED_BLOCK_ROWS), zip(bounds, bounds[1:])):
+                size = min(EMBED_BLOCK_ROWS, len(self.items) - start)
+                hashed = np.bincount(
+                    (rows[low:high] - start).astype(np.int64) * HASH_DIM + cells[low:high],
+                    weights=values[low:high],
+                    minlength=size * HASH_DIM,
+                )
+                yield start, hashed.reshape(size, HASH_DIM).astype(np.float32)
+
+        # Project onto the top right-singular vectors (eigenvectors of X^T X, accumulated one
+        # block at a time), then normalize so a dot product is a cosine similarity.
+        gram = np.zeros((HASH_DIM, HASH_DIM))
+        for _, hashed in blocks():
+            gram += hashed.T @ hashed
+        _, vectors = np.linalg.eigh(gram)
+        projection = np.ascontiguousarray(vectors[:, ::-1][:, :EMBEDDING_DIM], dtype=np.float32)
+
+        embeddings = np.empty((len(self.items), EMBEDDING_DIM), dtype=np.float32)
+        for start, hashed in blocks():
+            embeddings[start : start + len(hashed)] = hashed @ projection
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms > 0, norms, 1)
+        return embeddings
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def profile(self, titles: list[str]) -> np.ndarray | None:
+        # Later titles in the list are more recent and count for more.
+        docs = [self.index[title] for title in titles if title in self.index]
+        if not docs:
+            return None
+        weights = np.linspace(0.5, 1.0, len(docs), dtype=np.float32)
+        return weights @ self.embeddings[docs]
+
+    def top(self, vector: np.ndarray, exclude: set[str] = frozenset(), k: int = RECOMMEND_TOP_K) -> list[dict]:
+        scores = self.embeddings @ vector
+        excluded = [self.index[title] for title in exclude if title in self.index]
+        scores[excluded] = -np.inf
+
+        k = min(k, len(self.items) - len(excluded))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [self.items[doc] for doc in best]
+
+    def closest(self, vector: np.ndarray, titles: list[str]) -> int | None:
+        # Position in titles of the one most similar to vector; unknown titles never win.
+        docs = [self.index.get(title, -1) for title in titles]
+        known = [position for position, doc in enumerate(docs) if doc >= 0]
+        if not known:
+            return None
+        scores = self.embeddings[[docs[position] for position in known]] @ vector
+        return known[int(np.argmax(scores))]
+
+    def similar(self, title: str, k: int = RECOMMEND_TOP_K) -> list[dict]:
+        doc = self.index.get(title)
+        if doc is None:
+            return []
+        return self.top(self.embeddings[doc], exclude={title}, k=k)
@@ -0,0 +1,29 @@
+_MASK64 = (1 << 64) - 1
+_ROUNDS = 4
+
+
+def _mix(value: int) -> int:
+    # splitmix64 finaliser: cheap and deterministic across processes, unlike hash().
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+# Position -> item of a seeded pseudo-random permutation of range(size), in O(1) memory.
+# A balanced Feistel network is a bijection on the smallest even-bit domain covering size;
+# cycle-walking re-applies it until the value falls back inside range(size).
+def permute(index: int, size: int, seed: int) -> int:
+    if not 0 <= index < size:
+        raise ValueError(f"index {index} out of range for size {size}")
+
+    half = max(1, ((size - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    value = index
+    while True:
+        left, right = value >> half, value & mask
+        for round_no in range(_ROUNDS):
+            left, right = right, left ^ (_mix(seed ^ (round_no << 56) ^ right) & mask)
+        value = (left << half) | right
+        if value < size:
+            return value
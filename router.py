@@ -0,0 +1,35 @@
+from collections.abc import Awaitable, Callable
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+Action = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+
+
+# Plain-text messages are resolved with one dict lookup on the stripped text instead of a chain
+# of regex filters. Game keyboards only apply while the chat has a game running, so the game
+# state is looked up once, and only for text that is not a menu button.
+class TextRouter:
+    def __init__(
+        self,
+        buttons: dict[str, Action],
+        game_buttons: dict[str, Action],
+        game_answer: Action,
+        game_key: str = "emoji_game",
+    ) -> None:
+        self.buttons = buttons
+        self.game_buttons = game_buttons
+        self.game_answer = game_answer
+        self.game_key = game_key
+
+    async def __call__(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        message = update.effective_message
+        text = message.text.strip() if message and message.text else ""
+        if not text:
+            return
+
+        action = self.buttons.get(text)
+        if action is None and context.chat_data and context.chat_data.get(self.game_key):
+            action = self.game_buttons.get(text, self.game_answer)
+        if action is not None:
+            await action(update, context)
@@ -0,0 +1,95 @@
+import os
+import re
+
+import numpy as np
+
+SEARCH_LIMIT = int(os.environ.get("ANITIME_SEARCH_LIMIT", "5"))
+SEARCH_MIN_SCORE = float(os.environ.get("ANITIME_SEARCH_MIN_SCORE", "0.35"))
+# Matching part of a long title, or part of a description, counts for less than a whole title.
+TITLE_COVERAGE_WEIGHT = 0.7
+DESCRIPTION_WEIGHT = 0.6
+# Description trigrams found in more than this share of a large catalog carry no signal.
+DESCRIPTION_MAX_DF = 0.1
+DESCRIPTION_MIN_DOCS = 100
+MIN_QUERY_LENGTH = 2
+MAX_QUERY_LENGTH = 64
+
+# Titles are written in Cyrillic and Latin (and users type either), so both sides are folded to
+# one Latin spelling before trigrams are taken: "РЕ:ЗЕРО" and "re zero" index the same way.
+_TRANSLIT = str.maketrans(
+    {
+        "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+        "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+        "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "c", "ч": "ch", "ш": "sh", "щ": "sh",
+        "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    }
+)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(" ", text.casefold().translate(_TRANSLIT)).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    # Each word is padded so short words and word starts/ends still produce trigrams.
+    grams: set[str] = set()
+    for word in normalize(text).split():
+        padded = f" {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TitleIndex:
+    def __init__(self, anime: list[dict]) -> None:
+        self.items = tuple(item for item in anime if item.get("title"))
+        titles: dict[str, list[int]] = {}
+        descriptions: dict[str, list[int]] = {}
+        title_sizes = []
+
+        for doc, item in enumerate(self.items):
+            grams = trigrams(item["title"])
+            title_sizes.append(len(grams))
+            for gram in grams:
+                titles.setdefault(gram, []).append(doc)
+            for gram in trigrams(item.get("description", "")):
+                descriptions.setdefault(gram, []).append(doc)
+
+        max_df = len(self.items) * DESCRIPTION_MAX_DF if len(self.items) >= DESCRIPTION_MIN_DOCS else len(self.items)
+        self._title_sizes = np.array(title_sizes, dtype=np.float32)
+        self._titles = {gram: np.array(docs, dtype=np.int32) for gram, docs in titles.items()}
+        self._descriptions = {
+            gram: np.array(docs, dtype=np.int32) for gram, docs in descriptions.items() if len(docs) <= max_df
+        }
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _count(self, postings: dict[str, np.ndarray], grams: set[str]) -> np.ndarray:
+        # Every posting list holds each document once, so counting document ids across the
+        # query's lists gives the number of shared trigrams per document.
+        hits = [postings[gram] for gram in grams if gram in postings]
+        if not hits:
+            return np.zeros(len(self.items), dtype=np.float32)
+        return np.bincount(np.concatenate(hits), minlength=len(self.items)).astype(np.float32)
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+        query = normalize(query[:MAX_QUERY_LENGTH])
+        grams = trigrams(query)
+        if len(query) < MIN_QUERY_LENGTH or not grams or not self.items:
+            return []
+
+        title_hits = self._count(self._titles, grams)
+        # Dice rewards titles close to the query in length; coverage lets a query match one word
+        # of a long title. Descriptions are far longer than any query, so only coverage counts.
+        scores = np.maximum(
+            2 * title_hits / (len(grams) + self._title_sizes),
+            TITLE_COVERAGE_WEIGHT * title_hits / len(grams),
+        )
+        np.maximum(scores, DESCRIPTION_WEIGHT * self._count(self._descriptions, grams) / len(grams), out=scores)
+
+        matched = np.flatnonzero(scores >= SEARCH_MIN_SCORE)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        matched = matched[np.lexsort((matched, -scores[matched]))]
+        return [self.items[doc] for doc in matched]
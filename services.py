@@ -0,0 +1,108 @@
+import asyncio
+import datetime
+from collections.abc import Awaitable, Callable
+from functools import cached_property
+
+from anilist import AniListClient
+from broadcast import Broadcasts, run_daily
+from cache import CoverCache, FileIdCache
+from catalog import Catalog, CatalogStore
+from config import Config
+from covers import CoverResolver
+from images import CoverImages
+from metrics import start_metrics_server
+from ratelimit import SendBudget
+from stats import GameStats
+from storage import open_db
+
+
+# Everything the handlers share, built on first use so importing the bot or creating the
+# Application stays cheap. warm() loads only plain data, which is safe to inherit across fork();
+# database connections and HTTP clients are opened lazily in the process that uses them.
+class BotServices:
+    def __init__(self, config: Config) -> None:
+        self.config = config
+        self._background_tasks: set[asyncio.Task] = set()
+        self._metrics_server = None
+
+    @cached_property
+    def catalogs(self) -> CatalogStore:
+        return CatalogStore(self.config.catalog_path)
+
+    @cached_property
+    def send_budget(self) -> SendBudget:
+        return SendBudget()
+
+    @cached_property
+    def covers(self) -> CoverResolver:
+        return CoverResolver(AniListClient(endpoint=self.config.anilist_endpoint), CoverCache(open_db(self.config.db_path)))
+
+    @cached_property
+    def file_ids(self) -> FileIdCache:
+        return FileIdCache(open_db(self.config.db_path))
+
+    @cached_property
+    def images(self) -> CoverImages:
+        return CoverImages(open_db(self.config.db_path), self.config.image_dir)
+
+    @cached_property
+    def broadcasts(self) -> Broadcasts:
+        return Broadcasts(open_db(self.config.db_path))
+
+    @cached_property
+    def stats(self) -> GameStats:
+        return GameStats(open_db(self.config.db_path))
+
+    def warm(self) -> None:
+        self.catalogs
+        # Shared memory, so shard workers forked after this draw on one global send budget.
+        self.send_budget
+
+    async def prefetch_covers(self, catalog: Catalog) -> None:
+        await self.covers.prefetch([item["title"] for item in catalog.anime if item.get("title") and not item.get("photo_url")])
+
+        # Covers Telegram already has a file_id for never need the local copy.
+        sources = []
+        for item in catalog.anime:
+            source = item.get("photo_url") or self.covers.cache.get(item.get("title", ""))[1]
+            if source and source.startswith(("http://", "https://")) and self.file_ids.get(source) is None:
+                sources.append(source)
+        await self.images.prefetch(sources)
+
+    def start_background(self) -> None:
+        catalogs = self.catalogs
+        # Caches are shared through SQLite, so with several shard workers only the first warms them.
+        on_reload = self.prefetch_covers if self.config.shard == 0 else None
+        if on_reload is not None:
+            self._background_tasks.add(asyncio.create_task(on_reload(catalogs.current), name="cover_prefetch"))
+        self._background_tasks.add(asyncio.create_task(catalogs.watch(on_reload=on_reload), name="catalog_watch"))
+        self._background_tasks.add(asyncio.create_task(self.stats.run(), name="stats_writer"))
+
+    def start_daily(self, job: Callable[[datetime.date], Awaitable[None]]) -> None:
+        # Subscribers are global, so with several shard workers only the first broadcasts.
+        if self.config.shard == 0:
+            self._background_tasks.add(asyncio.create_task(run_daily(job), name="daily_broadcast"))
+
+    def start_metrics(self) -> None:
+        if self.config.metrics_port and self._metrics_server is None:
+            self._metrics_server = start_metrics_server(self.config.metrics_listen, self.config.metrics_port)
+
+    async def aclose(self) -> None:
+        if self._metrics_server is not None:
+            await asyncio.to_thread(self._metrics_server.shutdown)
+            self._metrics_server.server_close()
+            self._metrics_server = None
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks.clear()
+        if "covers" in self.__dict__:
+            await self.covers.aclose()
+        if "file_ids" in self.__dict__:
+            self.file_ids.close()
+        if "images" in self.__dict__:
+            await self.images.aclose()
+        if "broadcasts" in self.__dict__:
+            self.broadcasts.close()
+        if "stats" in self.__dict__:
+            await self.stats.aclose()
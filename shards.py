@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from collections.abc import Callable
+from dataclasses import replace
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+from queue import Full
+
+from telegram import Bot, Update
+from telegram.error import InvalidToken, RetryAfter, TelegramError
+from telegram.ext import Application
+
+from config import Config
+from ratelimit import retry_after_seconds
+from services import BotServices
+from webhook import set_webhook, start_webhook_server, stop_on_signals, webhook_secret
+
+POLL_TIMEOUT = 30
+POLL_MAX_BACKOFF = 60.0
+# Updates buffered per worker before the ingress pushes back: polling stops advancing its
+# offset, and the webhook answers with an error so Telegram redelivers later.
+SHARD_QUEUE_SIZE = int(os.environ.get("ANITIME_SHARD_QUEUE_SIZE", "10000"))
+WORKER_CHECK_INTERVAL = 1.0
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def shard_key(update: Update) -> int:
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return update.update_id
+
+
+def shard_of(key: int, shards: int) -> int:
+    # Python's modulo is non-negative for negative group ids too.
+    return key % shards
+
+
+async def serve_queue(application: Application, queue: Queue) -> None:
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    def pump() -> None:
+        while (payload := queue.get()) is not None:
+            update = Update.de_json(payload, application.bot)
+            asyncio.run_coroutine_threadsafe(application.update_queue.put(update), loop)
+        loop.call_soon_threadsafe(stop.set)
+
+    async with application:
+        await application.start()
+        if application.post_init:
+            await application.post_init(application)
+        threading.Thread(target=pump, name="shard-pump", daemon=True).start()
+        await stop.wait()
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def _run_worker(
+    index: int,
+    queue: Queue,
+    config: Config,
+    services: BotServices,
+    create_app: Callable[[Config, BotServices], Application],
+) -> None:
+    # The ingress process owns shutdown and stops workers with a None on their queue.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    worker_config = replace(
+        config,
+        shard=index,
+        metrics_port=config.metrics_port + index if config.metrics_port else 0,
+    )
+    # The services object was inherited over fork(), so this copy is private to the worker.
+    services.config = worker_config
+    asyncio.run(serve_queue(create_app(worker_config, services), queue))
+
+
+async def _poll(bot: Bot, route: Callable[[dict], None]) -> None:
+    await bot.delete_webhook()
+    offset = None
+    backoff = 1.0
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES)
+        except InvalidToken:
+            raise
+        except RetryAfter as exc:
+            await asyncio.sleep(retry_after_seconds(exc))
+            continue
+        except TelegramError as exc:
+            # Network errors, and Conflict while another instance is still polling, clear up by themselves.
+            _LOGGER.warning("getUpdates failed (%s), retrying in %.0fs", exc, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, POLL_MAX_BACKOFF)
+            continue
+
+        backoff = 1.0
+        for update in updates:
+            try:
+                route(update.to_dict())
+            except Full:
+                # The offset stays put, so this update and the rest of the batch are fetched again.
+                _LOGGER.warning("Shard queue is full, holding back update %d", update.update_id)
+                await asyncio.sleep(1)
+                break
+            offset = update.update_id + 1
+
+
+async def _watch(workers: list[BaseProcess]) -> BaseProcess:
+    while True:
+        for worker in workers:
+            if not worker.is_alive():
+                return worker
+        await asyncio.sleep(WORKER_CHECK_INTERVAL)
+
+
+async def _ingress(config: Config, route: Callable[[dict], None], workers: list[BaseProcess]) -> bool:
+    # Runs until a signal asks it to stop (True), or until the poller or a worker dies (False).
+    stop = stop_on_signals(asyncio.get_running_loop())
+    async with Bot(config.token) as bot:
+        server = None
+        if config.webhook_url:
+            secret = webhook_secret(config)
+            # A full shard queue raises out of route(); the error response makes Telegram retry.
+            server = start_webhook_server(config, route, secret)
+            await set_webhook(bot, config, secret)
+            source = None
+        else:
+            source = asyncio.create_task(_poll(bot, route), name="shard_poller")
+
+        stopped = asyncio.create_task(stop.wait())
+        watcher = asyncio.create_task(_watch(workers), name="shard_watch")
+        tasks = {stopped, watcher} | ({source} if source is not None else set())
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if server is not None:
+                server.shutdown()
+
+        if watcher.done() and not watcher.cancelled():
+            worker = watcher.result()
+            _LOGGER.error("Shard worker %s exited with code %s, shutting down", worker.name, worker.exitcode)
+            return False
+        if source is not None and source.done() and not source.cancelled():
+            _LOGGER.error("Polling stopped, shutting down", exc_info=source.exception())
+            return False
+        return True
+
+
+# One ingress process receives every update (polling or webhook) and forwards it, as a plain
+# dict over a pipe, to the worker that owns its chat. If a worker or the poller dies, the whole
+# group shuts down rather than silently losing that shard's chats. Workers are forked after the catalog is
+# loaded and share the SQLite-backed caches; chat_data and per-chat ordering live in exactly one
+# worker, so no state is shared between them.
+def run_sharded(config: Config, create_app: Callable[[Config, BotServices], Application]) -> None:
+    services = BotServices(config)
+    services.warm()
+
+    context = multiprocessing.get_context("fork")
+    queues = [context.Queue(SHARD_QUEUE_SIZE) for _ in range(config.workers)]
+    workers = [
+        context.Process(
+            target=_run_worker,
+            args=(index, queue, config, services, create_app),
+            name=f"anitime-shard-{index}",
+        )
+        for index, queue in enumerate(queues)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def route(payload: dict) -> None:
+        # put_nowait() only appends to the queue's buffer; a feeder thread writes to the pipe,
+        # so a slow or stuck worker never blocks the event loop or the webhook threads.
+        key = shard_key(Update.de_json(payload, None))
+        queues[shard_of(key, len(queues))].put_nowait(payload)
+
+    clean = False
+    try:
+        clean = asyncio.run(_ingress(config, route, workers))
+    finally:
+        for queue in queues:
+            try:
+                queue.put_nowait(None)
+            except Full:
+                pass
+        for worker in workers:
+            worker.join(timeout=30)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        for queue in queues:
+            # Whatever a worker left unread is dropped instead of blocking interpreter exit.
+            queue.cancel_join_thread()
+            queue.close()
+    # A non-zero exit lets the process supervisor restart the whole group.
+    if not clean:
+        raise SystemExit(1)
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+
+STATS_FLUSH_INTERVAL = float(os.environ.get("ANITIME_STATS_FLUSH_INTERVAL", "5"))
+STATS_BATCH_SIZE = int(os.environ.get("ANITIME_STATS_BATCH_SIZE", "500"))
+STATS_RANKING_INTERVAL = float(os.environ.get("ANITIME_STATS_RANKING_INTERVAL", "60"))
+STATS_TOP_SIZE = 10
+# Puzzles need this many attempts before they can be listed as the hardest.
+STATS_MIN_ATTEMPTS = 5
+
+_LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS player_stats (
+    user_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    games INTEGER NOT NULL DEFAULT 0,
+    answers INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    streak INTEGER NOT NULL DEFAULT 0,
+    best_streak INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS player_stats_correct ON player_stats (correct DESC);
+CREATE TABLE IF NOT EXISTS chat_stats (
+    chat_id INTEGER PRIMARY KEY,
+    games INTEGER NOT NULL DEFAULT 0,
+    answers INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS puzzle_stats (
+    answer TEXT NOT NULL,
+    emoji TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (answer, emoji)
+);
+"""
+
+# Streaks are folded in SQL against the stored row, so concurrent writers (shard processes)
+# never overwrite each other: "lead" counts correct answers before the first miss in this batch;
+# after a miss the stored streak is replaced by the batch's last run.
+PLAYER_UPSERT = """
+INSERT INTO player_stats (user_id, name, games, answers, correct, streak, best_streak)
+VALUES (:user_id, :name, :games, :answers, :correct, :new_streak, :new_best)
+ON CONFLICT (user_id) DO UPDATE SET
+    name = excluded.name,
+    games = games + excluded.games,
+    answers = answers + excluded.answers,
+    correct = correct + excluded.correct,
+    streak = CASE WHEN :reset THEN :run ELSE streak + :lead END,
+    best_streak = MAX(best_streak, streak + :lead, :best_run)
+"""
+CHAT_UPSERT = """
+INSERT INTO chat_stats (chat_id, games, answers, correct) VALUES (?, ?, ?, ?)
+ON CONFLICT (chat_id) DO UPDATE SET
+    games = games + excluded.games, answers = answers + excluded.answers, correct = correct + excluded.correct
+"""
+PUZZLE_UPSERT = """
+INSERT INTO puzzle_stats (answer, emoji, attempts, correct) VALUES (?, ?, ?, ?)
+ON CONFLICT (answer, emoji) DO UPDATE SET
+    attempts = attempts + excluded.attempts, correct = correct + excluded.correct
+"""
+
+
+class _PlayerDelta:
+    __slots__ = ("name", "games", "answers", "correct", "lead", "reset", "run", "best_run")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.games = self.answers = self.correct = 0
+        self.lead = self.run = self.best_run = 0
+        self.reset = False
+
+    def answer(self, correct: bool) -> None:
+        self.answers += 1
+        if not correct:
+            self.reset = True
+            self.run = 0
+            return
+        self.correct += 1
+        if self.reset:
+            self.run += 1
+            self.best_run = max(self.best_run, self.run)
+        else:
+            self.lead += 1
+
+    def merge(self, later: "_PlayerDelta") -> None:
+        # Appends the answers of a later delta, as if they had been recorded on this one.
+        self.name = later.name
+        self.games += later.games
+        self.answers += later.answers
+        self.correct += later.correct
+        if not self.reset:
+            self.lead += later.lead
+            self.reset, self.run, self.best_run = later.reset, later.run, later.best_run
+        elif not later.reset:
+            self.run += later.lead
+            self.best_run = max(self.best_run, self.run)
+        else:
+            self.best_run = max(self.best_run, self.run + later.lead, later.best_run)
+            self.run = later.run
+
+    def row(self, user_id: int) -> dict:
+        return {
+            "user_id": user_id,
+            "name": self.name,
+            "games": self.games,
+            "answers": self.answers,
+            "correct": self.correct,
+            "new_streak": self.run if self.reset else self.lead,
+            "new_best": max(self.lead, self.best_run),
+            "reset": self.reset,
+            "run": self.run,
+            "lead": self.lead,
+            "best_run": self.best_run,
+        }
+
+
+class Ranking:
+    def __init__(self, players: list[tuple], puzzles: list[tuple]) -> None:
+        # players: (name, correct, answers, best_streak); puzzles: (emoji, answer, attempts, correct)
+        self.players = players
+        self.puzzles = puzzles
+        self.refreshed_at = time.time()
+
+
+# Game results are aggregated in memory and written behind in batches: every flush turns all
+# answers since the last one into one additive upsert per player, chat and puzzle, in a single
+# transaction. /top reads a Ranking snapshot that is recomputed on a timer, never per request.
+class GameStats:
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        flush_interval: float = STATS_FLUSH_INTERVAL,
+        batch_size: int = STATS_BATCH_SIZE,
+        ranking_interval: float = STATS_RANKING_INTERVAL,
+    ) -> None:
+        self._conn = conn
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.ranking_interval = ranking_interval
+        with conn:
+            conn.executescript(SCHEMA)
+        self._players: dict[int, _PlayerDelta] = {}
+        self._chats: dict[int, list[int]] = {}
+        self._puzzles: dict[tuple[str, str], list[int]] = {}
+        self._pending = 0
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self.ranking = Ranking([], [])
+
+    def _player(self, user_id: int, name: str) -> _PlayerDelta:
+        delta = self._players.get(user_id)
+        if delta is None:
+            delta = self._players[user_id] = _PlayerDelta(name)
+        delta.name = name
+        return delta
+
+    def _chat(self, chat_id: int) -> list[int]:
+        return self._chats.setdefault(chat_id, [0, 0, 0])
+
+    def record_answer(self, chat_id: int, user_id: int, name: str, answer: str, emoji: str, correct: bool) -> None:
+        self._player(user_id, name).answer(correct)
+        chat = self._chat(chat_id)
+        chat[1] += 1
+        chat[2] += correct
+        puzzle = self._puzzles.setdefault((answer, emoji), [0, 0])
+        puzzle[0] += 1
+        puzzle[1] += correct
+        self._added()
+
+    def record_game(self, chat_id: int, user_ids: dict[int, str]) -> None:
+        for user_id, name in user_ids.items():
+            self._player(user_id, name).games += 1
+        self._chat(chat_id)[0] += 1
+        self._added()
+
+    def _added(self) -> None:
+        self._pending += 1
+        if self._pending >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._try_flush())
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not (self._players or self._chats or self._puzzles):
+                return
+            players, self._players = self._players, {}
+            chats, self._chats = self._chats, {}
+            puzzles, self._puzzles = self._puzzles, {}
+            self._pending = 0
+            try:
+                await asyncio.to_thread(self._write, players, chats, puzzles)
+            except Exception:
+                # The transaction was rolled back, so the batch goes back in front of whatever was
+                # recorded meanwhile and is written with the next flush. (On cancellation the
+                # thread may still commit it, so it is not restored then.)
+                self._restore(players, chats, puzzles)
+                raise
+
+    async def _try_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            _LOGGER.exception("Writing game stats failed; the batch is kept for the next flush")
+
+    def _restore(
+        self,
+        players: dict[int, _PlayerDelta],
+        chats: dict[int, list[int]],
+        puzzles: dict[tuple[str, str], list[int]],
+    ) -> None:
+        for user_id, delta in players.items():
+            later = self._players.get(user_id)
+            if later is not None:
+                delta.merge(later)
+            self._players[user_id] = delta
+        for chat_id, counts in chats.items():
+            self._chats[chat_id] = [old + new for old, new in zip(counts, self._chats.get(chat_id, (0, 0, 0)))]
+        for key, counts in puzzles.items():
+            self._puzzles[key] = [old + new for old, new in zip(counts, self._puzzles.get(key, (0, 0)))]
+
+    def _write(
+        self,
+        players: dict[int, _PlayerDelta],
+        chats: dict[int, list[int]],
+        puzzles: dict[tuple[str, str], list[int]],
+    ) -> None:
+        with self._conn:
+            self._conn.executemany(PLAYER_UPSERT, [delta.row(user_id) for user_id, delta in players.items()])
+            self._conn.executemany(CHAT_UPSERT, [(chat_id, *counts) for chat_id, counts in chats.items()])
+            self._conn.executemany(PUZZLE_UPSERT, [(*key, *counts) for key, counts in puzzles.items()])
+
+    def _read_ranking(self) -> Ranking:
+        players = self._conn.execute(
+            "SELECT name, correct, answers, best_streak FROM player_stats ORDER BY correct DESC LIMIT ?",
+            (STATS_TOP_SIZE,),
+        ).fetchall()
+        puzzles = self._conn.execute(
+            "SELECT emoji, answer, attempts, correct FROM puzzle_stats WHERE attempts >= ? "
+            "ORDER BY CAST(correct AS REAL) / attempts, attempts DESC LIMIT 5",
+            (STATS_MIN_ATTEMPTS,),
+        ).fetchall()
+        return Ranking(players, puzzles)
+
+    async def refresh_ranking(self) -> None:
+        self.ranking = await asyncio.to_thread(self._read_ranking)
+
+    def player(self, user_id: int) -> tuple | None:
+        # (games, answers, correct, streak, best_streak) as of the last flush.
+        return self._conn.execute(
+            "SELECT games, answers, correct, streak, best_streak FROM player_stats WHERE user_id = ?", (user_id,)
+        ).fetchone()
+
+    async def run(self) -> None:
+        next_ranking = 0.0
+        while True:
+            await self._try_flush()
+            if time.monotonic() >= next_ranking:
+                try:
+                    await self.refresh_ranking()
+                except sqlite3.Error:
+                    _LOGGER.exception("Reading the ranking failed; keeping the previous one")
+                next_ranking = time.monotonic() + self.ranking_interval
+            await asyncio.sleep(self.flush_interval)
+
+    async def aclose(self) -> None:
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        try:
+            await self._try_flush()
+        finally:
+            self._conn.close()
@@ -0,0 +1,12 @@
+import os
+import sqlite3
+
+DB_PATH = os.environ.get("ANITIME_DB", "anitime.sqlite3")
+
+
+def open_db(path: str = DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
@@ -0,0 +1,46 @@
+import random
+import types
+
+import Anitine_bot as bot
+from catalog import Catalog
+
+WORDS = ("небо", "клинок", "титан", "демон", "школа", "дракон", "shadow", "spirit", "ghost", "hunter")
+
+
+def _catalog(size: int) -> Catalog:
+    rng = random.Random(3)
+    anime = [
+        {"title": f"{' '.join(rng.sample(WORDS, 2))} {number}", "description": " ".join(rng.choices(WORDS, k=12))}
+        for number in range(size)
+    ]
+    return Catalog(anime=anime, emoji_game=[], aiky_messages=[])
+
+
+def _picks(catalog: Catalog, chat_data: dict, count: int) -> tuple[list[str], int]:
+    context = types.SimpleNamespace(chat_data=chat_data)
+    titles, steered = [], 0
+    for _ in range(count):
+        item = bot._pick_for_chat(context, catalog)
+        if item is not None:
+            steered += 1
+        else:
+            item = bot._next_in_cycle(context, catalog.anime)
+        titles.append(item["title"])
+    return titles, steered
+
+
+def test_searches_reorder_the_cycle_without_repeating_titles():
+    catalog = _catalog(300)
+    random.seed(1)
+    titles, steered = _picks(catalog, {"liked": [catalog.anime[0]["title"]]}, 600)
+    # Every cycle still shows the whole catalog once, steered picks included.
+    assert len(set(titles[:300])) == 300
+    assert len(set(titles[300:])) == 300
+    assert 0 < steered < 600
+
+
+def test_without_searches_every_pick_comes_from_the_cycle():
+    catalog = _catalog(50)
+    titles, steered = _picks(catalog, {}, 50)
+    assert steered == 0
+    assert sorted(titles) == sorted(item["title"] for item in catalog.anime)
@@ -0,0 +1,84 @@
+import asyncio
+import datetime
+import sqlite3
+
+import pytest
+from telegram.error import Forbidden
+
+import broadcast
+from broadcast import Broadcasts
+
+DAY = datetime.date(2026, 1, 1)
+
+
+@pytest.fixture
+def broadcasts(monkeypatch) -> Broadcasts:
+    monkeypatch.setattr(broadcast, "BROADCAST_CHUNK", 7)
+    monkeypatch.setattr(broadcast, "BROADCAST_WINDOW", 3)
+    broadcasts = Broadcasts(sqlite3.connect(":memory:"))
+    for chat_id in range(1, 21):
+        broadcasts.subscribe(chat_id)
+    broadcasts.begin(DAY, "Title")
+    return broadcasts
+
+
+class Recorder:
+    def __init__(self, crash_at: int | None = None, text_only: set[int] = frozenset()) -> None:
+        self.crash_at = crash_at
+        self.text_only = text_only
+        self.calls: list[tuple[int, str | None]] = []
+
+    async def __call__(self, chat_id: int, file_id: str | None) -> str | None:
+        if chat_id == self.crash_at:
+            raise RuntimeError("process died")
+        self.calls.append((chat_id, file_id))
+        if chat_id in self.text_only:
+            return None
+        return file_id or f"file-{chat_id}"
+
+
+def test_resumed_broadcast_skips_the_claimed_window_and_sends_nobody_twice(broadcasts):
+    first = Recorder(crash_at=8)
+    with pytest.raises(RuntimeError):
+        asyncio.run(broadcasts.fan_out(DAY, first))
+    _, cursor, file_id, sent, _, done = broadcasts.day(DAY)
+    # Chunks of 7 are sent in windows of 3: [1-3] [4-6] [7] [8-10] ...; the crash hit [8-10].
+    assert (cursor, file_id, done) == (10, "file-1", 0)
+
+    second = Recorder()
+    asyncio.run(broadcasts.fan_out(DAY, second))
+    first_ids = [chat_id for chat_id, _ in first.calls]
+    second_ids = [chat_id for chat_id, _ in second.calls]
+    assert not set(first_ids) & set(second_ids)
+    assert second_ids == list(range(11, 21))
+    # The resumed run reuses the uploaded photo from the start.
+    assert all(file_id == "file-1" for _, file_id in second.calls)
+    assert broadcasts.day(DAY)[3:] == (sent + 10, 0, 1)
+
+
+def test_finished_broadcast_is_not_sent_again(broadcasts):
+    asyncio.run(broadcasts.fan_out(DAY, Recorder()))
+    again = Recorder()
+    asyncio.run(broadcasts.fan_out(DAY, again))
+    assert again.calls == []
+
+
+def test_sends_stay_serial_until_a_file_id_comes_back(broadcasts):
+    recorder = Recorder(text_only={1, 2})
+    asyncio.run(broadcasts.fan_out(DAY, recorder))
+    # Chats 1 and 2 fell back to text, so chat 3 is still asked to upload; everyone after it
+    # gets chat 3's file_id.
+    assert recorder.calls[:3] == [(1, None), (2, None), (3, None)]
+    assert all(file_id == "file-3" for _, file_id in recorder.calls[3:])
+    assert broadcasts.day(DAY)[2] == "file-3"
+
+
+def test_blocked_chats_are_unsubscribed(broadcasts):
+    async def send(chat_id: int, file_id: str | None) -> str:
+        if chat_id % 5 == 0:
+            raise Forbidden("bot was blocked by the user")
+        return "file"
+
+    asyncio.run(broadcasts.fan_out(DAY, send))
+    assert broadcasts.day(DAY)[3:5] == (16, 4)
+    assert broadcasts._chunk(None, 100) == [chat_id for chat_id in range(1, 21) if chat_id % 5]
@@ -0,0 +1,46 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from catalog import CatalogStore
+
+VALID = {"anime": [{"title": "Frieren"}], "emoji_game": [], "aiky_messages": []}
+
+
+def _write(path, payload, stamp: int) -> None:
+    path.write_text(json.dumps(payload), encoding="utf-8")
+    # Distinct mtimes, so every rewrite is seen as a change even within one clock tick.
+    os.utime(path, ns=(stamp, stamp))
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        [1, 2],
+        {"anime": {"title": "Frieren"}},
+        {"anime": [{"title": 5}]},
+        {"anime": [{"title": "Frieren", "description": ["a"]}]},
+        {"emoji_game": [{"emoji": "🧝", "answer": 7}]},
+        {"aiky_messages": "hi"},
+    ],
+)
+def test_wrong_shape_keeps_the_previous_catalog_and_the_watch_running(tmp_path, payload):
+    path = tmp_path / "catalog.json"
+    _write(path, VALID, 10**18)
+    store = CatalogStore(str(path))
+    previous = store.current
+
+    async def main() -> None:
+        watch = asyncio.create_task(store.watch(interval=0.01))
+        _write(path, payload, 2 * 10**18)
+        await asyncio.sleep(0.05)
+        assert store.current is previous
+        _write(path, {**VALID, "anime": [{"title": "Mushishi"}]}, 3 * 10**18)
+        await asyncio.sleep(0.05)
+        assert not watch.done()
+        watch.cancel()
+
+    asyncio.run(main())
+    assert list(store.current.by_title) == ["Mushishi"]
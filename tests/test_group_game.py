@@ -0,0 +1,119 @@
+import asyncio
+import sqlite3
+import types
+
+import pytest
+
+import Anitine_bot as bot
+from catalog import Catalog
+from stats import GameStats
+
+CHAT_ID = -100
+
+
+class Context:
+    # Just enough of CallbackContext for the group game handlers: messages they would send are
+    # collected instead of being scheduled on an Application.
+    def __init__(self, catalog: Catalog) -> None:
+        self.chat_data: dict = {}
+        self.sent: list[str] = []
+        stats = GameStats(sqlite3.connect(":memory:", check_same_thread=False))
+        services = types.SimpleNamespace(catalogs=types.SimpleNamespace(current=catalog), stats=stats)
+        self.bot_data = {"services": services}
+        self.bot = types.SimpleNamespace(send_message=self._send_message)
+        self.application = types.SimpleNamespace(create_task=self._create_task, chat_data={CHAT_ID: self.chat_data})
+        self.tasks: list[asyncio.Task] = []
+
+    async def _send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.sent.append(text)
+
+    def _create_task(self, coroutine, update=None) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.append(task)
+        return task
+
+    @property
+    def state(self) -> dict:
+        return self.chat_data.get("emoji_game")
+
+
+def _update(user_id: int, text: str) -> types.SimpleNamespace:
+    async def reply_text(text: str, **kwargs) -> None:
+        pass
+
+    user = types.SimpleNamespace(id=user_id, full_name=f"Player {user_id}", first_name=f"P{user_id}")
+    return types.SimpleNamespace(
+        effective_chat=types.SimpleNamespace(id=CHAT_ID, type="supergroup"),
+        effective_user=user,
+        effective_message=types.SimpleNamespace(text=text, reply_text=reply_text),
+    )
+
+
+@pytest.fixture
+def catalog() -> Catalog:
+    titles = [f"Title {number}" for number in range(12)]
+    return Catalog(
+        anime=[{"title": title} for title in titles],
+        emoji_game=[{"emoji": f"{number}️⃣", "answer": title} for number, title in enumerate(titles)],
+        aiky_messages=[],
+    )
+
+
+def _replay(context: Context, updates: list) -> None:
+    # ChatOrderedUpdateProcessor runs one chat's updates one after another, so updates that
+    # arrive together are handled back to back against the same state.
+    async def main() -> None:
+        for handler, update in updates:
+            await handler(update, context)
+        # Debounced feedback edits are not under test here.
+        for _, task in context.bot_data.get("feedback_tasks", {}).values():
+            task.cancel()
+        await asyncio.gather(*context.tasks, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def _start(context: Context, starter: int = 1) -> None:
+    asyncio.run(bot.start_group_game(_update(starter, "Game"), context))
+
+
+def test_concurrent_skips_skip_one_round(catalog):
+    context = Context(catalog)
+    _start(context)
+    context.state["started_at"] -= bot.GROUP_SKIP_DEBOUNCE
+    _replay(context, [(bot.skip_riddle, _update(user_id, bot.NEW_RIDDLE_BUTTON)) for user_id in range(2, 7)])
+    assert context.state["round"] == 2
+    assert len(context.sent) == 1
+
+
+def test_skip_right_after_a_correct_answer_is_ignored(catalog):
+    context = Context(catalog)
+    _start(context)
+    answer = context.state["answer"]
+    wrong = next(option for option in context.state["options"] if option != answer)
+    _replay(
+        context,
+        [
+            (bot.emoji_game_answer, _update(2, wrong)),
+            (bot.emoji_game_answer, _update(3, answer)),
+            (bot.emoji_game_answer, _update(4, answer)),
+            (bot.skip_riddle, _update(5, bot.NEW_RIDDLE_BUTTON)),
+        ],
+    )
+    state = context.state
+    # Player 3 wins round 1; player 4's late answer and the skip meant for round 1 change nothing.
+    assert state["round"] == 2
+    assert state["scores"] == {"3": ["Player 3", 1]}
+    assert len(context.sent) == 1
+
+
+def test_only_the_starter_can_stop_a_group_game(catalog):
+    context = Context(catalog)
+    _start(context, starter=1)
+    _replay(context, [(bot.exit_emoji_game, _update(user_id, bot.EXIT_GAME_BUTTON)) for user_id in (2, 3)])
+    assert context.state is not None
+    assert context.sent == []
+
+    _replay(context, [(bot.exit_emoji_game, _update(1, bot.EXIT_GAME_BUTTON))])
+    assert context.state is None
+    assert context.sent[0].startswith("Игра остановлена.")
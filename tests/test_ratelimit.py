@@ -0,0 +1,121 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from telegram.error import RetryAfter
+
+from ratelimit import PRIORITY_BULK, SendBudget, SendScheduler
+
+
+def _scheduler(**kwargs) -> SendScheduler:
+    # Per-chat limits out of the way; each test looks at the global budget only.
+    return SendScheduler(chat_rate=1000, chat_burst=1000, group_rate=1000, group_burst=1000, **kwargs)
+
+
+async def _request(scheduler: SendScheduler, callback, chat_id: int, priority=None, endpoint="sendMessage", **data):
+    return await scheduler.process_request(callback, (), {}, endpoint, {"chat_id": chat_id, **data}, priority)
+
+
+def test_interactive_sends_overtake_queued_bulk_sends():
+    async def main() -> list[str]:
+        budget = SendBudget(rate=1000, bulk_reserve=0)
+        scheduler = _scheduler(budget=budget)
+        await scheduler.initialize()
+        order = []
+
+        def sender(name: str):
+            async def callback() -> bool:
+                order.append(name)
+                return True
+
+            return callback
+
+        # Held back so every request is queued before the first token is handed out.
+        budget.pause(0.05)
+        bulk = [asyncio.create_task(_request(scheduler, sender(f"bulk{i}"), i, PRIORITY_BULK)) for i in range(3)]
+        await asyncio.sleep(0)
+        interactive = [asyncio.create_task(_request(scheduler, sender(f"reply{i}"), 10 + i)) for i in range(2)]
+        await asyncio.gather(*bulk, *interactive)
+        await scheduler.shutdown()
+        return order
+
+    assert asyncio.run(main()) == ["reply0", "reply1", "bulk0", "bulk1", "bulk2"]
+
+
+def test_retry_after_pauses_every_send_and_retries():
+    async def main() -> None:
+        scheduler = _scheduler(budget=SendBudget(rate=1000))
+        await scheduler.initialize()
+        calls = []
+
+        async def flooded() -> str:
+            calls.append(("flooded", time.monotonic()))
+            if len(calls) == 1:
+                raise RetryAfter(timedelta(seconds=0.2))
+            return "sent"
+
+        async def other() -> str:
+            calls.append(("other", time.monotonic()))
+            return "other"
+
+        started = time.monotonic()
+        first = asyncio.create_task(_request(scheduler, flooded, 1))
+        await asyncio.sleep(0.05)
+        # A different chat is held back by the same pause.
+        assert await _request(scheduler, other, 2) == "other"
+        assert await first == "sent"
+        await scheduler.shutdown()
+
+        assert [name for name, _ in calls] == ["flooded", "other", "flooded"]
+        assert calls[1][1] - started >= 0.2
+        assert calls[2][1] - started >= 0.2
+
+    asyncio.run(main())
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def main() -> int:
+        scheduler = _scheduler(budget=SendBudget(rate=1000), max_retries=2)
+        await scheduler.initialize()
+        calls = 0
+
+        async def always_flooded() -> None:
+            nonlocal calls
+            calls += 1
+            raise RetryAfter(timedelta(seconds=0.01))
+
+        with pytest.raises(RetryAfter):
+            await _request(scheduler, always_flooded, 1)
+        await scheduler.shutdown()
+        return calls
+
+    assert asyncio.run(main()) == 3
+
+
+def test_identical_queued_edits_are_sent_once():
+    async def main() -> tuple[list[str], list[object]]:
+        budget = SendBudget(rate=1000)
+        scheduler = _scheduler(budget=budget)
+        await scheduler.initialize()
+        sent = []
+
+        def edit(text: str):
+            async def callback() -> dict:
+                sent.append(text)
+                return {"text": text}
+
+            return callback
+
+        budget.pause(0.05)
+        results = await asyncio.gather(
+            _request(scheduler, edit("a"), 1, endpoint="editMessageText", message_id=7, text="a"),
+            _request(scheduler, edit("a"), 1, endpoint="editMessageText", message_id=7, text="a"),
+            _request(scheduler, edit("b"), 1, endpoint="editMessageText", message_id=7, text="b"),
+        )
+        await scheduler.shutdown()
+        return sent, results
+
+    sent, results = asyncio.run(main())
+    assert sent == ["a", "b"]
+    assert results == [{"text": "a"}, {"text": "a"}, {"text": "b"}]
@@ -0,0 +1,59 @@
+import asyncio
+import types
+
+import pytest
+from telegram.error import BadRequest, Forbidden, TimedOut
+
+import Anitine_bot as bot
+
+URL = "https://example.org/cover.jpg"
+ITEM = {"title": "Frieren", "photo_url": URL}
+
+
+class FileIds(dict):
+    def set(self, key: str, value: str) -> None:
+        self[key] = value
+
+    def discard(self, key: str) -> None:
+        self.pop(key, None)
+
+
+class Message:
+    def __init__(self, errors: list[Exception | None]) -> None:
+        self.errors = errors
+        self.photos: list = []
+        self.texts: list[str] = []
+
+    async def reply_photo(self, photo, caption: str):
+        self.photos.append(photo)
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return types.SimpleNamespace(photo=[types.SimpleNamespace(file_id="new-file-id")])
+
+    async def reply_text(self, text: str) -> None:
+        self.texts.append(text)
+
+
+def _services(file_id: str | None) -> types.SimpleNamespace:
+    images = types.SimpleNamespace(get=lambda url: b"resized", schedule=lambda url: None)
+    return types.SimpleNamespace(file_ids=FileIds({URL: file_id} if file_id else {}), images=images)
+
+
+def test_rejected_file_id_falls_back_to_the_photo_and_is_replaced():
+    services = _services("stale-file-id")
+    message = Message([BadRequest("Wrong file identifier")])
+    asyncio.run(bot._send_anime(message, services, ITEM, "caption"))
+    assert message.photos == ["stale-file-id", URL]
+    assert services.file_ids == {URL: "new-file-id"}
+    assert message.texts == []
+
+
+@pytest.mark.parametrize("error", [TimedOut(), Forbidden("bot was blocked by the user")])
+def test_other_errors_are_not_retried_with_the_next_photo(error):
+    services = _services(None)
+    message = Message([error])
+    with pytest.raises(type(error)):
+        asyncio.run(bot._send_anime(message, services, ITEM, "caption"))
+    assert message.photos == [b"resized"]
+    assert message.texts == []
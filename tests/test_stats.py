@@ -0,0 +1,91 @@
+import asyncio
+import random
+import sqlite3
+
+import pytest
+
+from stats import GameStats
+
+
+def _expected(answers: list[bool]) -> tuple[int, int, int]:
+    # (correct, streak, best_streak) counted one answer at a time.
+    correct = streak = best = 0
+    for answer in answers:
+        correct += answer
+        streak = streak + 1 if answer else 0
+        best = max(best, streak)
+    return correct, streak, best
+
+
+def _stats() -> GameStats:
+    return GameStats(sqlite3.connect(":memory:", check_same_thread=False), batch_size=10**9)
+
+
+def _play(stats: GameStats, answers: list[bool], flush_after: set[int]) -> None:
+    async def main() -> None:
+        for number, correct in enumerate(answers):
+            stats.record_answer(1, 42, "Player", "Title", "🎬", correct)
+            if number in flush_after:
+                await stats.flush()
+        await stats.flush()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "answers, flush_after",
+    [
+        ([True, True, True], set()),
+        ([True, True, False, True], set()),
+        ([True, True], {1}),
+        ([True, True, True, True, False, True, True], {1}),
+        ([True, False, True, True, True, False, True], {2, 4}),
+        ([False, False, True], {0}),
+    ],
+)
+def test_streaks_fold_across_batches(answers, flush_after):
+    stats = _stats()
+    _play(stats, answers, flush_after)
+    _, answered, correct, streak, best = stats.player(42)
+    assert answered == len(answers)
+    assert (correct, streak, best) == _expected(answers)
+
+
+def test_streaks_fold_across_random_batches():
+    rng = random.Random(7)
+    for _ in range(200):
+        answers = [rng.random() < 0.7 for _ in range(rng.randint(1, 15))]
+        flush_after = {number for number in range(len(answers)) if rng.random() < 0.3}
+        stats = _stats()
+        _play(stats, answers, flush_after)
+        assert stats.player(42)[2:] == _expected(answers), (answers, flush_after)
+
+
+def test_failed_write_is_kept_for_the_next_flush():
+    stats = _stats()
+    write = stats._write
+    failures = iter([sqlite3.OperationalError("database is locked")])
+
+    def flaky_write(*batch) -> None:
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        write(*batch)
+
+    stats._write = flaky_write
+
+    async def main() -> None:
+        stats.record_game(1, {42: "Player"})
+        for correct in (True, True, False):
+            stats.record_answer(1, 42, "Player", "Title", "🎬", correct)
+        with pytest.raises(sqlite3.OperationalError):
+            await stats.flush()
+        # Answers recorded after the failed batch are appended to it, not lost or reordered.
+        for correct in (True, True):
+            stats.record_answer(1, 42, "Player", "Title", "🎬", correct)
+        await stats.flush()
+
+    asyncio.run(main())
+    assert stats.player(42) == (1, 5, 4, 2, 2)
+    assert stats._conn.execute("SELECT games, answers, correct FROM chat_stats").fetchone() == (1, 5, 4)
+    assert stats._conn.execute("SELECT attempts, correct FROM puzzle_stats").fetchone() == (5, 4)
@@ -0,0 +1,49 @@
+import asyncio
+import os
+from collections.abc import Awaitable
+from typing import Any
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+CONCURRENT_UPDATES = int(os.environ.get("ANITIME_CONCURRENT_UPDATES", "16"))
+PENDING_UPDATES = int(os.environ.get("ANITIME_PENDING_UPDATES", "1024"))
+
+
+# Updates from different chats run concurrently; updates from one chat run one at a time, in arrival order.
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    __slots__ = ("_chat_locks", "_workers")
+
+    def __init__(self, max_concurrent_updates: int = CONCURRENT_UPDATES, max_pending_updates: int = PENDING_UPDATES):
+        # The base semaphore bounds updates admitted (including ones queued behind their chat);
+        # _workers bounds the ones actually running, so a chatty chat cannot take every slot.
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self._workers = asyncio.Semaphore(max_concurrent_updates)
+        self._chat_locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        lock, users = self._chat_locks.get(chat.id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._chat_locks[chat.id] = (lock, users + 1)
+        try:
+            async with lock, self._workers:
+                await coroutine
+        finally:
+            lock, users = self._chat_locks[chat.id]
+            if users <= 1:
+                del self._chat_locks[chat.id]
+            else:
+                self._chat_locks[chat.id] = (lock, users - 1)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
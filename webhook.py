@@ -0,0 +1,89 @@
+import asyncio
+import secrets
+import signal
+import threading
+from collections.abc import Callable
+
+from flask import Flask, abort, request
+from telegram import Bot, Update
+from telegram.ext import Application
+from werkzeug.serving import BaseWSGIServer, make_server
+
+from config import Config
+
+
+def create_webhook_app(handle_update: Callable[[dict], None], path: str, secret: str) -> Flask:
+    flask_app = Flask(__name__)
+
+    @flask_app.post(f"/{path}")
+    def telegram_update():
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+            abort(403)
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            abort(400)
+
+        # Only hand the update over; whoever consumes it does the actual work.
+        handle_update(payload)
+        return "", 200
+
+    @flask_app.get("/healthz")
+    def healthz():
+        return "ok", 200
+
+    return flask_app
+
+
+def start_webhook_server(config: Config, handle_update: Callable[[dict], None], secret: str) -> BaseWSGIServer:
+    flask_app = create_webhook_app(handle_update, config.webhook_path, secret)
+    server = make_server(config.webhook_listen, config.webhook_port, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="webhook", daemon=True).start()
+    return server
+
+
+def webhook_secret(config: Config) -> str:
+    return config.webhook_secret or secrets.token_urlsafe(32)
+
+
+async def set_webhook(bot: Bot, config: Config, secret: str) -> None:
+    await bot.set_webhook(
+        url=f"{config.webhook_url.rstrip('/')}/{config.webhook_path}",
+        secret_token=secret,
+        allowed_updates=Update.ALL_TYPES,
+        max_connections=config.webhook_max_connections,
+    )
+
+
+def stop_on_signals(loop: asyncio.AbstractEventLoop) -> asyncio.Event:
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+async def serve_webhook(application: Application, config: Config, secret: str) -> None:
+    loop = asyncio.get_running_loop()
+    stop = stop_on_signals(loop)
+
+    def handle_update(payload: dict) -> None:
+        update = Update.de_json(payload, application.bot)
+        asyncio.run_coroutine_threadsafe(application.update_queue.put(update), loop)
+
+    async with application:
+        await application.start()
+        # Application.start() does not run the post_init/post_shutdown hooks; only run_polling/run_webhook do.
+        if application.post_init:
+            await application.post_init(application)
+        server = start_webhook_server(config, handle_update, secret)
+        await set_webhook(application.bot, config, secret)
+        try:
+            await stop.wait()
+        finally:
+            server.shutdown()
+            await application.stop()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, config: Config, secret: str) -> None:
+    asyncio.run(serve_webhook(application, config, secret))